@@ -1,60 +1,42 @@
 from coinbase_functions.coinbase_functions import *
+from coinbase_functions.strategy import LIVE_STRATEGY, select_buy_opportunities, select_sell_opportunities
+from coinbase_functions.risk import risk_model
+from coinbase_functions.profiling import profiler
+from coinbase_functions.budget import cycle_budget
+from coinbase_functions.shadow import shadow_runner
 import time
 import os
 from datetime import datetime
-import numpy as np
 
-def calculate_rsi(candles, periods=14):
-    """Calculate RSI using candle data"""
-    if not candles or len(candles) < periods + 1:
-        return None
-        
-    # Extract closing prices
-    closes = [candle['close'] for candle in candles]
-    prices = np.array(closes)
-    deltas = np.diff(prices)
-    
-    gain = [(x if x > 0 else 0) for x in deltas]
-    loss = [(-x if x < 0 else 0) for x in deltas]
-    
-    avg_gain = np.mean(gain[:periods])
-    avg_loss = np.mean(loss[:periods])
-    
-    if avg_loss == 0:
-        return 100
-    
-    rs = avg_gain/avg_loss
-    rsi = 100 - (100 / (1 + rs))
-    return rsi
+# Worker processes for the market scan (0 scans in this process)
+SCANNER_WORKERS = int(os.getenv('SCANNER_WORKERS', '0'))
 
-def calculate_moving_averages(candles):
-    """Calculate MAs using candle data"""
-    if not candles or len(candles) < 50:
-        return None, None
-    
-    closes = [candle['close'] for candle in candles]
-    ma20 = np.mean(closes[-20:])
-    ma50 = np.mean(closes[-50:])
-    return ma20, ma50
+def get_holding_exposures(account_data):
+    """Track holdings in the risk model and return current USD exposure per product"""
+    exposures = {}
+    for currency, holding in account_data.items():
+        if currency == FUNDING_CURRENCY or not holding.symbol:
+            continue
+        risk_model.observe(holding.symbol, holding.candle_data)
+        if holding.usd_value:
+            exposures[holding.symbol] = holding.usd_value
+    return exposures
 
-def analyze_volume(candles):
-    """Analyze if current volume is significantly higher than average"""
-    if not candles or len(candles) < 24:  # Need at least 24 hours of data
-        return False
-    
-    volumes = [candle['volume'] for candle in candles]
-    current_volume = volumes[-1]
-    avg_volume = np.mean(volumes[-24:])  # 24-hour average
+def analyze_buy_opportunities(market_data, strategy=LIVE_STRATEGY, exposures=None):
+    """
+    Analyze market data for buy opportunities with USDC balance check.
+    Buys are sized by correlation with current holdings (exposures, USD per product).
+    """
+    # Feed candidates to the risk model first, so it keeps tracking them even when not buying
+    for asset in market_data:
+        if asset.get('candle_data'):
+            risk_model.observe(asset['symbol'], asset['candle_data'])
     
-    return current_volume > (avg_volume * 1.5)
-
-def analyze_buy_opportunities(market_data, buy_threshold=-5.0):
-    """Analyze market data for buy opportunities with USDC balance check"""
-    # Get USDC balance first
+    # Get USDC balance
     accounts = client.get_accounts()
     usdc_balance = 0
     for account in accounts['accounts']:
-        if account['currency'] == 'USDC':
+        if account['currency'] == FUNDING_CURRENCY:
             usdc_balance = float(account['available_balance']['value'])
             break
     
@@ -62,246 +44,94 @@ def analyze_buy_opportunities(market_data, buy_threshold=-5.0):
     if usdc_balance < 25:  # Minimum USDC balance threshold
         print(f"Insufficient USDC balance ({usdc_balance}) for trading. Skipping buy opportunities.")
         return []
-        
-    all_opportunities = []  # Process opportunities only if we have sufficient balance
-    for asset in market_data:
-        try:
-            symbol = asset['symbol']
-            current_price = float(asset['price'])
-            change_24h = float(asset['change_24h'])
-            candle_data = asset.get('candle_data', [])
-            
-            # Skip if no candle data
-            if not candle_data:
-                continue
-            
-            # Calculate technical indicators
-            rsi = calculate_rsi(candle_data)
-            ma20, ma50 = calculate_moving_averages(candle_data)
-            volume_spike = analyze_volume(candle_data)
-            
-            # Scoring system (0-100)
-            score = 0
-            
-            # Price drop criterion (max 30 points)
-            if change_24h <= buy_threshold:
-                score += 30
-            
-            # RSI criterion (max 25 points)
-            if rsi is not None and rsi < 30:
-                score += 25
-            
-            # Moving Average criterion (max 25 points)
-            if ma20 and ma50 and current_price:
-                if current_price < ma20 < ma50:
-                    score += 25
-            
-            # Volume criterion (max 20 points)
-            if volume_spike:
-                score += 20
-            
-            # If score is high enough, add to opportunities list
-            if score >= 60:
-                rsi_str = f"{rsi:.1f}" if rsi is not None else "N/A"
-                reason = f'Buy score: {score}/100. Change: {change_24h:.2f}%, RSI: {rsi_str}'
-                
-                all_opportunities.append({
-                    'product_id': symbol,
-                    'side': 'BUY',
-                    'amount': 25,  # Default buy amount in USD
-                    'reason': reason,
-                    'score': score  # Add score for sorting
-                })
-                
-        except (ValueError, TypeError, KeyError) as e:
-            print(f"Error analyzing {asset.get('symbol', 'unknown')}: {str(e)}")
-            continue
     
-    # Sort by score and take top 5
-    buy_opportunities = sorted(all_opportunities, key=lambda x: x['score'], reverse=True)[:5]
-    # Remove score from final output
-    for opp in buy_opportunities:
-        del opp['score']
-            
-    return buy_opportunities
+    return select_buy_opportunities(market_data, strategy, exposures, verbose=True)
 
-def analyze_sell_opportunities(account_data, sell_threshold=3.0):
+def analyze_sell_opportunities(account_data, strategy=LIVE_STRATEGY):
     """Analyze holdings for sell opportunities using multiple indicators"""
-    all_opportunities = []
     print(f"\nAnalyzing {len(account_data)} holdings for sell opportunities...")
-    
-    for currency, details in account_data.items():
-        try:
-            if not details['coin_amount'] or not details['current_price']:
-                continue
-                
-            entry_price = details['entry_price']
-            current_price = details['current_price']
-            candle_data = details['candle_data']
-            
-            if not entry_price or not current_price:
-                continue
-            
-            # Calculate profit percentage
-            profit_percentage = ((current_price - entry_price) / entry_price) * 100
-            
-            print(f"\nAnalyzing {currency}:")
-            print(f"Entry Price: {entry_price}")
-            print(f"Current Price: {current_price}")
-            print(f"Profit: {profit_percentage:.2f}%")
-            
-            # Calculate technical indicators
-            rsi = calculate_rsi(candle_data)
-            ma20, ma50 = calculate_moving_averages(candle_data)
-            
-            # Safe printing of technical indicators
-            if rsi is not None:
-                print(f"RSI: {rsi:.1f}")
-            else:
-                print("RSI: N/A")
-                
-            if ma20 is not None:
-                print(f"MA20: {ma20:.2f}")
-            else:
-                print("MA20: N/A")
-                
-            if ma50 is not None:
-                print(f"MA50: {ma50:.2f}")
-            else:
-                print("MA50: N/A")
-            
-            # Scoring system (0-100)
-            score = 0
-            
-            # Profit threshold scoring (max 30 points)
-            if profit_percentage >= sell_threshold:
-                score += 30
-                print("✓ Profit threshold met (+30 points)")
-            elif profit_percentage >= (sell_threshold * 0.5):  # Half of threshold still gets some points
-                score += 15
-                print("✓ Partial profit threshold met (+15 points)")
-            
-            # RSI scoring (max 25 points)
-            if rsi is not None:
-                if rsi > 70:
-                    score += 25
-                    print("✓ RSI overbought condition met (+25 points)")
-                elif rsi > 65:  # Added intermediate condition
-                    score += 15
-                    print("✓ RSI approaching overbought (+15 points)")
-            
-            # Moving average trend scoring (max 25 points)
-            if ma20 and ma50 and current_price:
-                if current_price > ma20 > ma50:
-                    score += 25
-                    print("✓ Strong uptrend detected (+25 points)")
-                elif current_price > ma20:  # Added intermediate condition
-                    score += 15
-                    print("✓ Above MA20 (+15 points)")
-            
-            # Price momentum scoring (max 20 points)
-            if candle_data and len(candle_data) > 1:
-                prev_price = candle_data[-2]['close']
-                price_momentum = (current_price - prev_price) / prev_price * 100
-                if price_momentum > 1.5:  # Reduced from 2.0
-                    score += 20
-                    print("✓ Strong price momentum (+20 points)")
-                elif price_momentum > 0.75:  # Added intermediate condition
-                    score += 10
-                    print("✓ Moderate price momentum (+10 points)")
-            
-            print(f"Final Score: {score}/100")
-            
-            # Lower the minimum score threshold
-            if score >= 50:  # Reduced from 60
-                reason = f'Sell score: {score}/100. Profit: {profit_percentage:.1f}%'
-                if rsi is not None:
-                    reason += f', RSI: {rsi:.1f}'
-                else:
-                    reason += ', RSI: N/A'
-                    
-                all_opportunities.append({
-                    'product_id': f"{currency}-USD",
-                    'side': 'SELL',
-                    'reason': reason,
-                    'score': score
-                })
-                print("→ Added to sell opportunities!")
-                
-        except (ValueError, TypeError, KeyError) as e:
-            print(f"Error analyzing {currency}: {str(e)}")
-            continue
-    
-    # Sort by score and take top 5
-    sell_opportunities = sorted(all_opportunities, key=lambda x: x['score'], reverse=True)[:5]
-    # Remove score from final output
-    for opp in sell_opportunities:
-        del opp['score']
-    
+    sell_opportunities = select_sell_opportunities(account_data, strategy, verbose=True)
     print(f"\nFound {len(sell_opportunities)} qualified sell opportunities out of {len(account_data)} holdings")
     return sell_opportunities
 
 def main():
+    profiler.install_signal_handler()
+    fill_tracker.start()
+    
     while True:
-        try:
-            # First check USDC balance
-            accounts = client.get_accounts()
-            usdc_balance = 0
-            for account in accounts['accounts']:
-                if account['currency'] == 'USDC':
-                    usdc_balance = float(account['available_balance']['value'])
-                    break
+        cycle_budget.start()
+        with profiler.cycle():
+            try:
+                # First check USDC balance
+                with profiler.stage('usdc_balance'):
+                    accounts = client.get_accounts()
+                    usdc_balance = 0
+                    for account in accounts['accounts']:
+                        if account['currency'] == FUNDING_CURRENCY:
+                            usdc_balance = float(account['available_balance']['value'])
+                            break
 
-            print(f"\nCurrent USDC balance: {usdc_balance}")
+                print(f"\nCurrent USDC balance: {usdc_balance}")
 
-            # Get account data for existing holdings first
-            print("Fetching account data...")
-            account_data = get_account_balances()
-            
-            # Only fetch market data if we have sufficient USDC balance
-            buy_actions = []
-            if usdc_balance >= 25:  # Minimum USDC balance threshold
-                print("\nFetching market data for new opportunities...")
-                market_data = get_market_data()[0]
-                print("Analyzing buy opportunities...")
-                buy_actions = analyze_buy_opportunities(market_data)
-            else:
-                print("\nInsufficient USDC balance for new purchases. Skipping buy analysis.")
-            
-            print("Analyzing sell opportunities...")
-            sell_actions = analyze_sell_opportunities(account_data)
-            
-            # Combine all trade actions
-            trade_actions = buy_actions + sell_actions
-            
-            # Log the actions
-            timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-            os.makedirs('trade_logs', exist_ok=True)
-            
-            with open(f'trade_logs/trading_log.txt', 'a') as f:
-                f.write(f"\n\n=== {timestamp} ===\n")
-                f.write(json.dumps(trade_actions, indent=2))
-            
-            if trade_actions:
-                print(f"\nExecuting {len(trade_actions)} trade actions...")
-                execute_trade_actions(trade_actions)
-            else:
-                print("\nNo trade actions to execute.")
-            
-        except Exception as e:
-            print(f"Error in main loop: {str(e)}")
+                # Get account data for existing holdings first
+                print("Fetching account data...")
+                with profiler.stage('account_balances'), cycle_budget.stage('account_balances'):
+                    account_data = get_account_balances(budget=cycle_budget)
+                
+                # Only fetch market data if we have sufficient USDC balance
+                market_data = []
+                buy_actions = []
+                if usdc_balance >= 25:  # Minimum USDC balance threshold
+                    print("\nFetching market data for new opportunities...")
+                    with profiler.stage('market_data'), cycle_budget.stage('market_data'):
+                        market_data = get_market_data(budget=cycle_budget, workers=SCANNER_WORKERS)[0]
+                    print("Analyzing buy opportunities...")
+                    with profiler.stage('buy_analysis'):
+                        exposures = get_holding_exposures(account_data)
+                        buy_actions = analyze_buy_opportunities(market_data, exposures=exposures)
+                else:
+                    print("\nInsufficient USDC balance for new purchases. Skipping buy analysis.")
+                
+                print("Analyzing sell opportunities...")
+                with profiler.stage('sell_analysis'):
+                    sell_actions = analyze_sell_opportunities(account_data)
+                
+                # Combine all trade actions
+                trade_actions = buy_actions + sell_actions
+                
+                # Log the actions
+                timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+                os.makedirs('trade_logs', exist_ok=True)
+                
+                with open(f'trade_logs/trading_log.txt', 'a') as f:
+                    f.write(f"\n\n=== {timestamp} ===\n")
+                    f.write(json.dumps(trade_actions, indent=2))
+                
+                # Evaluate strategy variants on the same snapshot, without extra API calls
+                with profiler.stage('shadow'):
+                    shadow_runner.run(market_data, account_data, product_index, candle_store)
+                
+                if trade_actions:
+                    print(f"\nExecuting {len(trade_actions)} trade actions...")
+                    with profiler.stage('execution'), cycle_budget.stage('execution'):
+                        execute_trade_actions(trade_actions)
+                else:
+                    print("\nNo trade actions to execute.")
+                
+            except Exception as e:
+                print(f"Error in main loop: {str(e)}")
             
+        cycle_budget.report()
+        
         print("\nWaiting for next candle period...")
-        # Wait for 15 minutes, but check every minute for clean 15-minute marks
-        current_time = datetime.now()
-        minutes_to_next_15 = 15 - (current_time.minute % 15)
-        sleep_time = minutes_to_next_15 * 60 - current_time.second
+        # Sleep until the candle boundary this cycle was budgeted for, so the schedule never drifts
+        sleep_time = cycle_budget.time_to_next_period()
         
         # Sleep in 1-minute intervals
         while sleep_time > 0:
             time.sleep(min(60, sleep_time))  # Sleep for 1 minute or remaining time
-            sleep_time -= 60
-            print(f"Time until next analysis: {sleep_time//60} minutes")
+            sleep_time = cycle_budget.boundary - time.time()
+            print(f"Time until next analysis: {int(max(sleep_time, 0) // 60)} minutes")
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,120 @@
+import os
+import json
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class CycleBudget:
+    """
+    Time budget for one trading cycle, ending shortly before the next candle boundary.
+
+    Each stage gets a share of the cycle's time. Work that can be dropped (e.g. candle
+    fetches for lower ranked candidates) asks `allow()` before running, and is skipped
+    and recorded once its stage or the whole cycle is out of time.
+    """
+
+    def __init__(self, period=900, safety_margin=30, min_budget=120, allotments=None,
+                 log_file='trade_logs/cycle_budget_log.txt'):
+        self.period = period
+        self.safety_margin = safety_margin
+        self.min_budget = min_budget
+        # Share of the total cycle budget per stage, stages without an allotment only get the cycle deadline
+        self.allotments = allotments or {
+            'account_balances': 0.25,
+            'market_data': 0.5,
+            'execution': 0.15
+        }
+        self.log_file = log_file
+
+        self.started = None
+        self.boundary = None
+        self.deadline = None
+        self._stage = None
+        self._stage_deadline = None
+        self.stage_times = {}
+        self.skipped = {}
+
+    def start(self, now=None):
+        """Start a cycle, targeting the next candle boundary (or the one after if it is too close)"""
+        now = now or time.time()
+        boundary = (now // self.period + 1) * self.period
+        if boundary - self.safety_margin - now < self.min_budget:
+            boundary += self.period
+
+        self.started = now
+        self.boundary = boundary
+        self.deadline = boundary - self.safety_margin
+        self._stage = None
+        self._stage_deadline = None
+        self.stage_times = {}
+        self.skipped = {}
+        return self
+
+    def remaining(self):
+        """Seconds left before the running stage's deadline (or the cycle's)"""
+        return self.stage_deadline() - time.time()
+
+    @contextmanager
+    def stage(self, name):
+        """Run a stage with its allotted share of the cycle budget"""
+        start = time.time()
+        allotment = self.allotments.get(name)
+        self._stage = name
+        if allotment is None:
+            self._stage_deadline = self.deadline
+        else:
+            self._stage_deadline = min(start + allotment * (self.deadline - self.started), self.deadline)
+        try:
+            yield self
+        finally:
+            self.stage_times[name] = self.stage_times.get(name, 0.0) + time.time() - start
+            self._stage = None
+            self._stage_deadline = None
+
+    def stage_deadline(self):
+        """Deadline of the running stage, or of the cycle if no stage is running"""
+        return self._stage_deadline or self.deadline
+
+    def skip(self, items):
+        """Record work that was skipped because it did not fit in the budget (or failed, e.g. a fetch)"""
+        self.skipped.setdefault(self._stage or 'cycle', []).extend(items)
+
+    def allow(self, item):
+        """Check whether optional work on an item fits in the budget, recording it as skipped if not"""
+        if time.time() < self.stage_deadline():
+            return True
+        self.skip([item])
+        return False
+
+    def time_to_next_period(self):
+        """Seconds until the boundary this cycle targets, moving to the next one if it was missed"""
+        now = time.time()
+        if now >= self.boundary:
+            missed = int((now - self.boundary) // self.period) + 1
+            print(f"Cycle overran its deadline, skipping {missed} candle boundary(s)")
+            self.boundary += missed * self.period
+        return self.boundary - now
+
+    def report(self):
+        """Print and log stage durations and skipped work for the cycle"""
+        elapsed = time.time() - self.started
+        print(f"\nCycle took {elapsed:.1f}s of {self.deadline - self.started:.1f}s budget")
+        for stage, items in self.skipped.items():
+            print(f"Skipped {len(items)} items in {stage} (time budget or failed fetch): {', '.join(map(str, items))}")
+
+        try:
+            os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
+            with open(self.log_file, 'a') as f:
+                f.write(f"\n\n=== {datetime.fromtimestamp(self.started).strftime('%Y-%m-%d_%H-%M-%S')} ===\n")
+                f.write(json.dumps({
+                    'elapsed': round(elapsed, 2),
+                    'budget': round(self.deadline - self.started, 2),
+                    'stage_times': {name: round(seconds, 2) for name, seconds in self.stage_times.items()},
+                    'skipped': self.skipped
+                }, indent=2))
+        except OSError as e:
+            print(f"Failed to write cycle budget log: {e}")
+
+
+cycle_budget = CycleBudget()
@@ -1,87 +1,117 @@
 import os
 import re
+import math
 import uuid
 import json
 import time
 from coinbase.rest import RESTClient
 from datetime import datetime, timedelta
 import requests
+from coinbase_functions.products import ProductIndex
+from coinbase_functions.portfolio import CandleStore, Holding
+from coinbase_functions.orderbook import OrderBookCache, parse_book, estimate_fill, plan_child_orders
+from coinbase_functions.fills import PositionLedger, FillTracker
+from coinbase_functions.scanner import scan_market
+from coinbase_functions.risk import risk_model
 
 
 client = RESTClient(api_key=os.getenv('CDP_API_KEY_NAME'), api_secret=os.getenv('CDP_API_KEY_PRIVATE_KEY'))
 
+# Quote currency used for market data / signals, and the currency orders are funded with
+QUOTE_CURRENCY = 'USD'
+FUNDING_CURRENCY = 'USDC'
+
+# Public market data API (candles, order books), can point at a local stand-in for testing
+PUBLIC_API_URL = os.getenv('COINBASE_PUBLIC_API_URL', 'https://api.exchange.coinbase.com')
+# Longest a single public API request may take (seconds)
+REQUEST_TIMEOUT = 10
+# Order books are fetched right before placing an order, so they get a shorter timeout
+ORDER_BOOK_TIMEOUT = 5
+
+# Orders whose estimated slippage exceeds this (%) are split into child orders
+MAX_SLIPPAGE = 0.5
+
+product_index = ProductIndex()
+
+def refresh_product_index(max_age=60):
+    """
+    Refresh the product index from the products listing if it is older than max_age seconds.
+    """
+    if product_index.updated_at is None or time.time() - product_index.updated_at > max_age:
+        product_index.refresh(client.get_products().to_dict()['products'])
+    return product_index
+
 # 1. Get account balances
-def get_account_balances():
+def get_account_balances(budget=None):
+    """
+    Get non-zero balances as {currency: Holding}.
+    With a budget, holding candles are loaded here (ahead of the market scan) while the budget allows,
+    holdings skipped at the deadline get no candles. Without one, candles are loaded lazily per holding.
+    """
     accounts = client.get_accounts()
     balances = {}
     
-    # Get transactions first
-    transactions = get_transaction_history()
+    # Market data for portfolio coins comes from the product index
+    refresh_product_index()
     
-    # Get market data for portfolio coins without candles
-    market_data = client.get_products()
-    market_data_by_currency = {}
+    # Only include balances that are greater than 0.000001 (6 decimal places), rounded to 6 decimal places
+    held = {}
+    for account in accounts['accounts']:
+        balance = float(account['available_balance']['value'])
+        if balance > 0.000001:
+            held[account['currency']] = round(balance, 6)
     
-    # Filter market data for USD pairs and create lookup dictionary
-    for product in market_data.to_dict()['products']:
-        if product['product_id'].endswith("-USD"):
-            base_currency = product['product_id'].split('-')[0]
-            if product['price']:  # Only include if price exists
-                market_data_by_currency[base_currency] = {
-                    'symbol': product['product_id'],
-                    'price': float(product['price']),
-                    'change_24h': float(product['price_percentage_change_24h']) if product['price_percentage_change_24h'] else None,
-                    'status': product['status']
-                }
+    # Positions closed outside the tracker must not be averaged into a later buy
+    position_ledger.retain(held)
     
-    # Create a mapping of transactions by currency
-    transactions_by_currency = {}
-    for transaction in transactions:
-        base_currency = transaction['product_id'].split('-')[0]
-        if base_currency not in transactions_by_currency:
-            transactions_by_currency[base_currency] = []
-        transactions_by_currency[base_currency].append(transaction)
+    # Entry prices come from the fill ledger, the order history is only listed for currencies it doesn't know yet
+    unknown = [currency for currency in held if currency not in position_ledger]
+    if unknown:
+        seed_position_ledger(unknown, held)
     
     # Build balances with transactions and market data
-    for account in accounts['accounts']:
-        currency = account['currency']
-        balance = float(account['available_balance']['value'])
+    for currency, balance in held.items():
+        position_ledger.sync_units(currency, balance)
         
-        # Only include balances that are greater than 0.000001 (6 decimal places)
-        if balance > 0.000001:  
-            # Round the balance to 6 decimal places
-            balance = round(balance, 6)
-            
-            # Get latest transaction for entry price
-            currency_transactions = transactions_by_currency.get(currency, [])
-            latest_transaction = currency_transactions[0] if currency_transactions else None
-            entry_price = latest_transaction.get('entry_price') if latest_transaction else None
-            
-            # Get current market data
-            market_info = market_data_by_currency.get(currency, {})
-            current_price = market_info.get('price')
-            
-            # Calculate USD value
-            usd_value = float(balance) * current_price if current_price else None
-            
-            # Get candle data for the currency
-            candle_data = []
-            if market_info:  # Only get candles if we have market info
-                symbol = market_info['symbol']
-                candle_data = get_candles_public(symbol)
-            
-            balances[currency] = {
-                'coin_amount': balance,
-                'usd_value': usd_value,
-                'entry_price': entry_price,
-                'current_price': current_price,
-                'market_data': market_info,
-                'transactions': currency_transactions,
-                'candle_data': candle_data  # Add candle data to the response
-            }
+        # Get current market data
+        market_info = product_index.market_info(currency, QUOTE_CURRENCY)
+        
+        # Candles are shared with the market scan
+        candles = candle_store.series(market_info.symbol) if market_info else None
+        if candles is not None and budget and currency != FUNDING_CURRENCY:
+            if budget.allow(market_info.symbol):
+                candles.load(timeout=budget.remaining())
+            else:
+                candles = None
+        
+        balances[currency] = Holding(
+            currency,
+            balance,
+            entry_price=position_ledger.entry_price(currency),
+            market_data=market_info,
+            transactions=position_ledger.fills(currency),
+            candles=candles
+        )
             
     return balances
 
+def seed_position_ledger(currencies, balances):
+    """
+    Seed ledger positions from the latest order of each currency (one order history listing).
+    """
+    latest_orders = {
+        product_index.base_of(transaction['product_id']): transaction
+        for transaction in get_transaction_history()
+    }
+    for currency in currencies:
+        transaction = latest_orders.get(currency)
+        position_ledger.seed(
+            currency,
+            balances[currency],
+            transaction['entry_price'] if transaction else None,
+            [transaction] if transaction else []
+        )
+
 # 2. Get transaction history for a specific account
 def get_transaction_history():
     transactions = client.list_orders()
@@ -97,8 +127,8 @@ def get_transaction_history():
     for order in transactions['orders']:
         if order.status != 'CANCELLED':
             try:
-                # Extract the base currency from the product_id (e.g., 'BTC' from 'BTC-USDC')
-                base_currency = order.product_id.split('-')[0]
+                # Base currency of the product (e.g., 'BTC' for 'BTC-USDC')
+                base_currency = product_index.base_of(order.product_id)
                 
                 # Skip if we don't have a non-zero balance for this currency
                 if base_currency not in non_zero_currencies:
@@ -151,13 +181,18 @@ def get_transaction_history():
 
 
 # 3. Get market data
-def get_market_data(portfolio_only=False):
+def get_market_data(portfolio_only=False, quote=QUOTE_CURRENCY, budget=None, workers=0):
     """
     Get market data for all coins or just portfolio coins.
     Args:
         portfolio_only (bool): If True, only return data for coins in portfolio
+        quote (str): Quote currency of the markets to scan
+        budget (CycleBudget): If given, candle fetches for the lowest ranked
+            candidates are skipped once the budget runs out (portfolio coins are never skipped)
+        workers (int): If set, candidates are fetched and scored across this many worker
+            processes and only the best scoring ones are returned
     """
-    products = client.get_products()
+    refresh_product_index()
     filtered_market_data = []
     all_candle_data = {}
     
@@ -172,56 +207,75 @@ def get_market_data(portfolio_only=False):
         }
         portfolio_coins = set(portfolio_balances.keys())
     
-    for product_data in products.to_dict()['products']:
-        base_currency = product_data['product_id'].split('-')[0]
+    for product_data in product_index.products(quote):
+        base_currency = product_data['base']
         
         # Skip if portfolio_only is True and coin isn't in portfolio
         if portfolio_only and base_currency not in portfolio_coins:
             continue
             
-        if product_data['product_id'].endswith("-USD"):
-            if not all([product_data['price'], 
-                       product_data['price_percentage_change_24h'],
-                       product_data['volume_24h']]):
-                continue
-                
-            product_info = {
-                'symbol': product_data['product_id'],
-                'price': float(product_data['price']),
-                'change_24h': float(product_data['price_percentage_change_24h']),
-                'volume_24h': float(product_data['volume_24h']),
-                'status': product_data['status']
-            }
-            
-            # Add USD value calculation for portfolio coins
-            if portfolio_only:
-                if base_currency in portfolio_balances:
-                    product_info['usd_value'] = portfolio_balances[base_currency] * float(product_data['price'])
+        # A 0.0 change or volume is valid data, only a missing value (or price) disqualifies
+        if (not product_data['price'] or
+                product_data['change_24h'] is None or
+                product_data['volume_24h'] is None):
+            continue
             
-            # Apply filters only for non-portfolio coins
-            if portfolio_only:
-                if product_info['status'] == 'online' and not product_data['is_disabled']:
-                    filtered_market_data.append(product_info)
-            else:
-                if (product_info['status'] == 'online' and 
-                    not product_data['is_disabled'] and 
-                    (product_info['volume_24h'] > 100000 or 
-                     abs(product_info['change_24h']) > 2)):
-                    filtered_market_data.append(product_info)
+        product_info = {
+            'symbol': product_data['product_id'],
+            'price': product_data['price'],
+            'change_24h': product_data['change_24h'],
+            'volume_24h': product_data['volume_24h'],
+            'status': product_data['status']
+        }
+        
+        # Add USD value calculation for portfolio coins
+        if portfolio_only:
+            if base_currency in portfolio_balances:
+                product_info['usd_value'] = portfolio_balances[base_currency] * product_data['price']
+        
+        # Apply filters only for non-portfolio coins
+        if portfolio_only:
+            if product_info['status'] == 'online' and not product_data['is_disabled']:
+                filtered_market_data.append(product_info)
+        else:
+            if (product_info['status'] == 'online' and 
+                not product_data['is_disabled'] and 
+                (product_info['volume_24h'] > 100000 or 
+                 abs(product_info['change_24h']) > 2)):
+                filtered_market_data.append(product_info)
     
-    # Sort and limit only for non-portfolio data
+    # Rank non-portfolio data so the most relevant candidates get their candles first
     if not portfolio_only:
-        filtered_market_data.sort(key=lambda x: x['volume_24h'], reverse=True)
+        filtered_market_data.sort(key=lambda x: (abs(x['change_24h']), x['volume_24h']), reverse=True)
+    
+    # Fetch, decode and score in worker processes, keeping only each strategy's best candidates per shard
+    if workers and not portfolio_only:
+        deadline = budget.stage_deadline() if budget else None
+        # Products already loaded this period (e.g. holdings) are scored from the store instead of fetched again
+        for product in filtered_market_data:
+            cached = candle_store.cached(product['symbol'])
+            if cached:
+                product['candle_data'] = cached
+        fetched_market_data, skipped, returns = scan_market(filtered_market_data, get_candles_public, workers=workers, deadline=deadline)
+        if budget and skipped:
+            budget.skip(skipped)
+        for product in fetched_market_data:
+            candle_store.put(product['symbol'], product['candle_data'])
+        # Every fetched product feeds the risk model, not only the candidates sent back
+        for symbol, (times, product_returns) in returns.items():
+            risk_model.observe_returns(symbol, times, product_returns)
+        return fetched_market_data, all_candle_data
     
     # Get candle data
+    fetched_market_data = []
     for product in filtered_market_data:
-        candle_data = get_candles_public(product['symbol'])
-        product['candle_data'] = candle_data
-    
-    if not portfolio_only:
-        filtered_market_data.sort(key=lambda x: abs(x['change_24h']), reverse=True)
+        if budget and not portfolio_only and not budget.allow(product['symbol']):
+            continue
+        series = candle_store.series(product['symbol'])
+        product['candle_data'] = series.load(timeout=budget.remaining()) if budget else series.candles
+        fetched_market_data.append(product)
     
-    return filtered_market_data, all_candle_data
+    return fetched_market_data, all_candle_data
 
 def get_portfolio_market_data():
     """
@@ -230,12 +284,13 @@ def get_portfolio_market_data():
     return get_market_data(portfolio_only=True)
 
 # 4. Get candles
-def get_candles_public(product):
+def get_candles_public(product, timeout=None):
     """
     Get candle data using Coinbase's public API endpoint.
+    The request timeout is REQUEST_TIMEOUT, or less if a shorter timeout (e.g. the time left in the cycle budget) is given.
     """
     try:
-        url = f"https://api.exchange.coinbase.com/products/{product}/candles"
+        url = f"{PUBLIC_API_URL}/products/{product}/candles"
         
         # Changed to 15-minute candles (900 seconds) and 2 days of data
         params = {
@@ -244,7 +299,8 @@ def get_candles_public(product):
             'end': datetime.now().isoformat()
         }
         
-        response = requests.get(url, params=params)
+        timeout = REQUEST_TIMEOUT if timeout is None else min(timeout, REQUEST_TIMEOUT)
+        response = requests.get(url, params=params, timeout=max(timeout, 1))
         response.raise_for_status()
         
         candles = response.json()
@@ -269,6 +325,94 @@ def get_candles_public(product):
         print(f"Error fetching candles for {product}: {e}")
         return []
 
+candle_store = CandleStore(get_candles_public)
+
+def get_order_book_public(product):
+    """
+    Get the L2 order book using Coinbase's public API endpoint.
+    """
+    try:
+        response = requests.get(f"{PUBLIC_API_URL}/products/{product}/book", params={'level': 2},
+                                timeout=ORDER_BOOK_TIMEOUT)
+        response.raise_for_status()
+        return parse_book(response.json())
+        
+    except Exception as e:
+        print(f"Error fetching order book for {product}: {e}")
+        return None
+
+order_books = OrderBookCache(get_order_book_public)
+
+
+def get_order_status(order_id):
+    """
+    Get an order's current status and fills.
+    """
+    return client.get_order(order_id).to_dict()['order']
+
+def apply_fill_to_ledger(fill):
+    position_ledger.apply_fill(product_index.base_of(fill['product_id']), fill)
+
+# Fills are pushed to the ledger (and fill log) as soon as they happen
+position_ledger = PositionLedger()
+fill_tracker = FillTracker(get_order_status)
+fill_tracker.subscribe(apply_fill_to_ledger)
+
+
+def format_size(value, increment):
+    """Format an order size with the number of decimals of the product's increment"""
+    decimals = max(0, -math.floor(math.log10(increment))) if increment else 10
+    formatted = '{:.{}f}'.format(value, decimals)
+    return formatted.rstrip('0').rstrip('.') if '.' in formatted else formatted
+
+def plan_order_sizes(product, side, size, size_in_quote=False, max_slippage=MAX_SLIPPAGE):
+    """
+    Check the estimated market impact of an order against the cached L2 book and split
+    it into child orders if slippage would exceed max_slippage (%).
+    Child sizes are rounded down to the product increment, the last one takes the remainder.
+    """
+    book = order_books.get(product['product_id'])
+    if book is None:
+        print(f"No order book for {product['product_id']}, placing a single order")
+        return [size]
+    
+    min_size = product['quote_min_size' if size_in_quote else 'base_min_size'] or 0.0
+    estimate = estimate_fill(book, side, size, size_in_quote)
+    children = plan_child_orders(book, side, size, size_in_quote, max_slippage, min_size=min_size)
+    
+    if estimate is None:
+        print(f"Order book too thin to fill {size} on {product['product_id']}")
+    else:
+        print(f"Estimated fill {estimate['avg_price']} ({estimate['slippage']:.2f}% slippage over {estimate['levels']} levels)")
+    if len(children) == 1:
+        return children
+    
+    print(f"Splitting into {len(children)} child orders to stay within {max_slippage}% slippage")
+    increment = product['quote_increment' if size_in_quote else 'base_increment']
+    if increment:
+        rounded = [(child // increment) * increment for child in children[:-1]]
+        children = rounded + [size - sum(rounded)]
+    return children
+
+
+def get_order_product(product_id):
+    """
+    Resolve the market an order is placed on. Signals use QUOTE_CURRENCY markets, which
+    are traded through the FUNDING_CURRENCY market; other quote currencies trade directly.
+    """
+    refresh_product_index()
+    base_currency = product_index.base_of(product_id)
+    quote_currency = product_index.quote_of(product_id)
+    if quote_currency == QUOTE_CURRENCY:
+        quote_currency = FUNDING_CURRENCY
+    
+    markets = product_index.quotes(base_currency)
+    product = markets.get(quote_currency)
+    if product is None:
+        available = ', '.join(sorted(markets)) or 'none'
+        raise ValueError(f"No {base_currency}-{quote_currency} market available (quotes: {available})")
+    return product
+
 
 def execute_trade_actions(trade_actions):
     """
@@ -289,56 +433,64 @@ def execute_trade_actions(trade_actions):
         for account in accounts['accounts']
     }
     
-    # Check USDC balance for buy orders
-    usdc_balance = balance_map.get('USDC', 0.0)
-    print(f"Available USDC balance: {usdc_balance}")
+    print(f"Available {FUNDING_CURRENCY} balance: {balance_map.get(FUNDING_CURRENCY, 0.0)}")
     
     for index, action in enumerate(trade_actions, 1):
         print(f"\nProcessing trade {index} of {len(trade_actions)}:")
         print(f"Action details: {json.dumps(action, indent=2)}")
         
         try:
-            product_id = str(action['product_id'])
+            product = get_order_product(str(action['product_id']))
             side = str(action['side'])
-            base_currency = product_id.split('-')[0]
+            base_currency = product['base']
+            quote_currency = product['quote']
 
             if side.upper() == 'BUY':
-                # Check if we have enough USDC for this buy
-                required_usdc = float(action['amount'])
-                if required_usdc > usdc_balance:
-                    raise ValueError(f"Insufficient USDC balance. Required: {required_usdc}, Available: {usdc_balance}")
-                usdc_balance -= required_usdc  # Deduct from available balance for next trades
+                # Check if we have enough of the quote currency for this buy
+                required_quote = float(action['amount'])
+                quote_balance = balance_map.get(quote_currency, 0.0)
+                if required_quote > quote_balance:
+                    raise ValueError(f"Insufficient {quote_currency} balance. Required: {required_quote}, Available: {quote_balance}")
+                balance_map[quote_currency] = quote_balance - required_quote  # Deduct from available balance for next trades
                 
-                response = client.market_order(
-                    client_order_id=str(uuid.uuid4()),
-                    product_id=product_id.split('-')[0]+'-USDC',
-                    side='BUY',
-                    quote_size=str(required_usdc)
-                )
+                child_sizes = plan_order_sizes(product, 'BUY', required_quote, size_in_quote=True)
+                size_field, increment = 'quote_size', product['quote_increment']
                 
             else:  # SELL
                 available_balance = balance_map.get(base_currency, 0.0)
                 if available_balance <= 0:
                     raise ValueError(f"No available balance for {base_currency}")
                 
-                product = client.get_product(product_id)
-                base_increment = float(product.base_increment)
+                base_increment = product['base_increment']
                 crypto_amount = (available_balance // base_increment) * base_increment
-                crypto_amount_str = '{:.10f}'.format(crypto_amount).rstrip('0').rstrip('.')
+                if crypto_amount <= 0:
+                    raise ValueError(f"{base_currency} balance {available_balance} is below the order increment {base_increment}")
+                
+                child_sizes = plan_order_sizes(product, 'SELL', crypto_amount)
+                size_field, increment = 'base_size', base_increment
+
+            for child, child_size in enumerate(child_sizes, 1):
+                if child > 1:
+                    time.sleep(3)  # Give the book time to refill between child orders
                 
                 response = client.market_order(
                     client_order_id=str(uuid.uuid4()),
-                    product_id=product_id.split('-')[0]+'-USDC',
-                    side='SELL',
-                    base_size=crypto_amount_str
+                    product_id=product['product_id'],
+                    side=side.upper(),
+                    **{size_field: format_size(child_size, increment)}
                 )
-
-            print(f"Trade {index} executed successfully: {json.dumps(response.to_dict(), indent=2)}")
-            results.append({
-                "status": "success",
-                "action": action,
-                "response": response.to_dict()
-            })
+                
+                order_id = response.to_dict().get('success_response', {}).get('order_id')
+                if order_id:
+                    fill_tracker.track(order_id, product['product_id'], side)
+                
+                print(f"Trade {index} ({child}/{len(child_sizes)}) executed successfully: {json.dumps(response.to_dict(), indent=2)}")
+                results.append({
+                    "status": "success",
+                    "action": action,
+                    "child": f"{child}/{len(child_sizes)}",
+                    "response": response.to_dict()
+                })
             
         except Exception as e:
             error_msg = f"Failed to execute trade {index} ({action['product_id']} {action['side']}): {str(e)}"
@@ -355,9 +507,6 @@ def execute_trade_actions(trade_actions):
     print(f"Total trades attempted: {len(trade_actions)}")
     print(f"Successful trades: {len([r for r in results if r['status'] == 'success'])}")
     print(f"Failed trades: {len([r for r in results if r['status'] == 'failed'])}")
-    print(f"Remaining USDC balance: {usdc_balance}")
+    print(f"Remaining {FUNDING_CURRENCY} balance: {balance_map.get(FUNDING_CURRENCY, 0.0)}")
     
     return results
-
-
-
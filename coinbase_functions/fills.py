@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime
+
+# Order statuses after which no more fills can arrive
+TERMINAL_STATUSES = {'FILLED', 'CANCELLED', 'EXPIRED', 'FAILED'}
+
+
+def _float(value):
+    return float(value) if value not in (None, '') else 0.0
+
+
+class PositionLedger:
+    """
+    Average cost per currency, updated from fill events as they arrive instead of
+    being re-derived from the full order history every cycle. Units are only kept to
+    weight the average, the exchange balance stays the source of truth for sizing orders.
+    """
+
+    def __init__(self):
+        self.positions = {}  # currency -> {'units', 'entry_price', 'fills'}
+        self._lock = threading.Lock()
+
+    def __contains__(self, currency):
+        return currency in self.positions
+
+    def seed(self, currency, units, entry_price, transactions=None):
+        """Set a position from the account balance and order history"""
+        with self._lock:
+            self.positions[currency] = {
+                'units': units,
+                'entry_price': entry_price,
+                'fills': list(transactions or [])
+            }
+
+    def sync_units(self, currency, units):
+        """Correct units to the exchange balance (e.g. after deposits or manual trades)"""
+        with self._lock:
+            if currency in self.positions:
+                self.positions[currency]['units'] = units
+
+    def retain(self, currencies):
+        """Drop positions that are no longer held (e.g. closed by a manual trade or fills missed around a restart)"""
+        with self._lock:
+            for currency in [currency for currency in self.positions if currency not in currencies]:
+                del self.positions[currency]
+
+    def apply_fill(self, currency, fill):
+        """Update a position for a fill, averaging the cost basis on buys"""
+        with self._lock:
+            position = self.positions.setdefault(currency, {'units': 0.0, 'entry_price': None, 'fills': []})
+            position['fills'].insert(0, fill)  # Most recent first, like the order history
+
+            if fill['side'] == 'BUY':
+                units = position['units'] + fill['size']
+                cost = position['units'] * (position['entry_price'] or fill['price']) + fill['value']
+                position['entry_price'] = cost / units if units else fill['price']
+                position['units'] = units
+            else:
+                position['units'] = max(position['units'] - fill['size'], 0.0)
+
+    def entry_price(self, currency):
+        position = self.positions.get(currency)
+        return position['entry_price'] if position else None
+
+    def fills(self, currency):
+        position = self.positions.get(currency)
+        return position['fills'] if position else []
+
+
+class FillTracker:
+    """
+    Tracks submitted orders and pushes fill events to subscribers as soon as they happen.
+
+    A background thread incrementally polls only the order IDs that are still open
+    (via fetch_order, e.g. the REST get_order endpoint or a local stand-in). Updates
+    from a push feed such as the user WebSocket channel can be fed to handle_update directly.
+    """
+
+    def __init__(self, fetch_order, interval=2.0, max_failures=30, log_file='trade_logs/fills_log.txt'):
+        self.fetch_order = fetch_order
+        self.interval = interval
+        self.max_failures = max_failures  # Consecutive failed polls before an order is given up on
+        self.log_file = log_file
+
+        self._orders = {}  # order_id -> last seen fill state
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def subscribe(self, listener):
+        """Call listener(fill) for every fill event"""
+        self._listeners.append(listener)
+
+    def track(self, order_id, product_id, side):
+        """Start tracking a submitted order"""
+        with self._lock:
+            self._orders[order_id] = {
+                'product_id': product_id,
+                'side': side.upper(),
+                'filled_size': 0.0,
+                'filled_value': 0.0,
+                'failures': 0
+            }
+        self._wake.set()
+
+    @property
+    def pending(self):
+        return list(self._orders)
+
+    def handle_update(self, order):
+        """
+        Process an order status update (order_id, status, filled_size, total_value_after_fees).
+        Emits a fill event for any newly filled quantity and returns the events.
+        """
+        with self._lock:
+            state = self._orders.get(order['order_id'])
+            if state is None:
+                return []
+
+            filled_size = _float(order.get('filled_size'))
+            filled_value = _float(order.get('total_value_after_fees'))
+            size = filled_size - state['filled_size']
+            value = filled_value - state['filled_value']
+            state['filled_size'], state['filled_value'] = filled_size, filled_value
+            state['failures'] = 0
+
+            if order.get('status') in TERMINAL_STATUSES:
+                del self._orders[order['order_id']]
+
+        if size <= 0:
+            return []
+
+        fill = {
+            'order_id': order['order_id'],
+            'product_id': state['product_id'],
+            'side': state['side'],
+            'size': size,
+            'value': value,
+            'price': value / size,
+            'status': order.get('status'),
+            'time': datetime.now().isoformat()
+        }
+        self._log(fill)
+        for listener in self._listeners:
+            try:
+                listener(fill)
+            except Exception as e:
+                print(f"Error handling fill for {fill['order_id']}: {str(e)}")
+        return [fill]
+
+    def poll_once(self):
+        """Fetch the status of every open tracked order once"""
+        fills = []
+        for order_id in self.pending:
+            try:
+                fills += self.handle_update(self.fetch_order(order_id))
+            except Exception as e:
+                print(f"Error polling order {order_id}: {str(e)}")
+                self._failed(order_id)
+        return fills
+
+    def _failed(self, order_id):
+        """Count a failed poll, and stop tracking the order after max_failures in a row"""
+        with self._lock:
+            state = self._orders.get(order_id)
+            if state is None:
+                return
+            state['failures'] += 1
+            if state['failures'] < self.max_failures:
+                return
+            del self._orders[order_id]
+        print(f"Giving up on order {order_id} after {self.max_failures} failed polls")
+
+    def start(self):
+        """Start the background poller (a daemon thread, it exits with the process)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            if not self._orders:
+                # Nothing to watch, sleep until an order is tracked
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            self.poll_once()
+            time.sleep(self.interval)
+
+    def _log(self, fill):
+        try:
+            os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
+            with open(self.log_file, 'a') as f:
+                f.write(f"\n\n=== {datetime.now().strftime('%Y-%m-%d_%H-%M-%S')} ===\n")
+                f.write(json.dumps(fill, indent=2))
+        except OSError as e:
+            print(f"Failed to write fill log: {e}")
@@ -0,0 +1,207 @@
+import numpy as np
+
+# Raw inputs supplied by the caller; everything else is derived from these
+RAW_INPUTS = ('candles', 'current_price', 'entry_price')
+
+# Indicator registry: name -> (input names, compute function)
+INDICATORS = {}
+
+# Indicators included in LLM payloads
+PAYLOAD_INDICATORS = ('rsi', 'ma20', 'ma50', 'price_momentum', 'volume_spike')
+
+
+def indicator(name, inputs):
+    """
+    Register an indicator that is computed from the named inputs.
+    Inputs can be raw inputs or other registered indicators.
+    """
+    def decorator(func):
+        INDICATORS[name] = (tuple(inputs), func)
+        return func
+    return decorator
+
+
+def depends_on(name, targets):
+    """Check whether an indicator depends (directly or transitively) on any of the targets"""
+    if name in targets:
+        return True
+    if name not in INDICATORS:
+        return False
+    return any(depends_on(dep, targets) for dep in INDICATORS[name][0])
+
+
+class IndicatorSet:
+    """
+    Memoized indicator values for one product and one candle period.
+    Each indicator is computed at most once, on first access.
+    """
+
+    def __init__(self, product_id, candles):
+        self.product_id = product_id
+        self._values = {name: None for name in RAW_INPUTS}
+        self._values['candles'] = candles or []
+
+    def bind(self, **inputs):
+        """Set raw inputs, dropping cached indicators that depend on a changed input"""
+        changed = set()
+        for name, value in inputs.items():
+            if name not in RAW_INPUTS:
+                raise KeyError(f"Unknown indicator input: {name}")
+            if self._values.get(name) != value:
+                self._values[name] = value
+                changed.add(name)
+
+        if changed:
+            for name in list(self._values):
+                if name not in RAW_INPUTS and depends_on(name, changed):
+                    del self._values[name]
+        return self
+
+    def get(self, name):
+        """Get an indicator value, computing it (and its inputs) if needed"""
+        if name in self._values:
+            return self._values[name]
+        if name not in INDICATORS:
+            raise KeyError(f"Unknown indicator: {name}")
+
+        inputs, func = INDICATORS[name]
+        value = func(*[self.get(dep) for dep in inputs])
+        self._values[name] = value
+        return value
+
+    __getitem__ = get
+
+    def snapshot(self, names):
+        """Get several indicators as a plain dictionary"""
+        return {name: self.get(name) for name in names}
+
+
+class IndicatorEngine:
+    """
+    Keeps one IndicatorSet per product, reused until a new candle arrives.
+    Sets from an older candle period are dropped once a newer period is seen.
+    """
+
+    def __init__(self):
+        self._sets = {}
+        self._latest = None  # Newest candle time seen
+
+    def for_product(self, product_id, candles, **inputs):
+        """Get the indicator set for a product's current candles, binding any raw inputs"""
+        candles = candles or []
+        candle_key = None
+        if candles:
+            newest = max(candles[0]['time'], candles[-1]['time'])
+            candle_key = (len(candles), candles[0]['time'], candles[-1]['time'], newest)
+            if self._latest is None or newest > self._latest:
+                self._latest = newest
+                self._evict()
+
+        cached = self._sets.get(product_id)
+        if cached is None or cached[0] != candle_key:
+            cached = (candle_key, IndicatorSet(product_id, candles))
+            self._sets[product_id] = cached
+        return cached[1].bind(**inputs)
+
+    def _evict(self):
+        """Drop indicator sets whose candles end before the newest period"""
+        self._sets = {
+            product_id: cached for product_id, cached in self._sets.items()
+            if cached[0] is not None and cached[0][3] >= self._latest
+        }
+
+    def for_holding(self, holding):
+        """Get the indicator set for a Holding from get_account_balances, None if it has no market"""
+        if not holding.symbol:
+            return None
+        return self.for_product(
+            holding.symbol,
+            holding.candle_data,
+            current_price=holding.current_price,
+            entry_price=holding.entry_price
+        )
+
+
+indicator_engine = IndicatorEngine()
+
+
+# Series
+
+@indicator('closes', ['candles'])
+def closes(candles):
+    return np.array([candle['close'] for candle in candles], dtype=float)
+
+@indicator('volumes', ['candles'])
+def volumes(candles):
+    return np.array([candle['volume'] for candle in candles], dtype=float)
+
+@indicator('deltas', ['closes'])
+def deltas(closes):
+    return np.diff(closes)
+
+@indicator('gains', ['deltas'])
+def gains(deltas):
+    return np.where(deltas > 0, deltas, 0)
+
+@indicator('losses', ['deltas'])
+def losses(deltas):
+    return np.where(deltas < 0, -deltas, 0)
+
+@indicator('prev_close', ['closes'])
+def prev_close(closes):
+    return float(closes[-2]) if len(closes) > 1 else None
+
+
+# Technical indicators
+
+@indicator('rsi', ['gains', 'losses'])
+def rsi(gains, losses, periods=14):
+    """Calculate RSI using candle data"""
+    if len(gains) < periods:
+        return None
+
+    avg_gain = np.mean(gains[:periods])
+    avg_loss = np.mean(losses[:periods])
+
+    if avg_loss == 0:
+        return 100
+
+    rs = avg_gain/avg_loss
+    return float(100 - (100 / (1 + rs)))
+
+@indicator('ma20', ['closes'])
+def ma20(closes):
+    """20 period MA, only reported once there is enough data for the MA50"""
+    if len(closes) < 50:
+        return None
+    return float(np.mean(closes[-20:]))
+
+@indicator('ma50', ['closes'])
+def ma50(closes):
+    if len(closes) < 50:
+        return None
+    return float(np.mean(closes[-50:]))
+
+@indicator('volume_spike', ['volumes'])
+def volume_spike(volumes):
+    """Check if current volume is significantly higher than average"""
+    if len(volumes) < 24:  # Need at least 24 hours of data
+        return False
+
+    avg_volume = np.mean(volumes[-24:])  # 24-hour average
+    return bool(volumes[-1] > (avg_volume * 1.5))
+
+
+# Price based indicators
+
+@indicator('price_momentum', ['current_price', 'prev_close'])
+def price_momentum(current_price, prev_close):
+    if not current_price or not prev_close:
+        return None
+    return (current_price - prev_close) / prev_close * 100
+
+@indicator('profit_percentage', ['current_price', 'entry_price'])
+def profit_percentage(current_price, entry_price):
+    if not current_price or not entry_price:
+        return None
+    return ((current_price - entry_price) / entry_price) * 100
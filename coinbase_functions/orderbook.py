@@ -0,0 +1,113 @@
+import math
+import time
+import numpy as np
+
+
+class OrderBookCache:
+    """Short-lived cache of L2 order books, so a batch of actions on a product shares one fetch"""
+
+    def __init__(self, fetch, ttl=5):
+        self.fetch = fetch
+        self.ttl = ttl
+        self._books = {}  # product_id -> (fetched_at, book)
+
+    def get(self, product_id):
+        cached = self._books.get(product_id)
+        if cached and time.time() - cached[0] < self.ttl:
+            return cached[1]
+
+        book = self.fetch(product_id)
+        if book is not None:
+            self._books[product_id] = (time.time(), book)
+        return book
+
+
+def parse_book(data):
+    """Convert an L2 book response ({'bids': [[price, size, ...]], 'asks': ...}) to price/size arrays"""
+    def levels(rows):
+        if not rows:
+            return np.zeros((0, 2))
+        return np.array([[float(row[0]), float(row[1])] for row in rows])
+    return {'bids': levels(data.get('bids')), 'asks': levels(data.get('asks'))}
+
+
+def _depth(book, side):
+    """Levels walked by a market order of this side, with cumulative base and quote depth"""
+    levels = book['asks'] if side.upper() == 'BUY' else book['bids']
+    prices, sizes = levels[:, 0], levels[:, 1]
+    return prices, np.cumsum(sizes), np.cumsum(prices * sizes)
+
+
+def estimate_fill(book, side, size, size_in_quote=False):
+    """
+    Estimate the average fill price and slippage (% from the best price) of a market order.
+    Size is in quote currency if size_in_quote, otherwise in base currency.
+    Returns None if the book is too thin to fill the order.
+    """
+    prices, cum_base, cum_quote = _depth(book, side)
+    depth = cum_quote if size_in_quote else cum_base
+    i = int(np.searchsorted(depth, size))
+    if i >= len(prices):
+        return None
+
+    prev_base = cum_base[i - 1] if i else 0.0
+    prev_quote = cum_quote[i - 1] if i else 0.0
+    if size_in_quote:
+        quote = size
+        base = prev_base + (size - prev_quote) / prices[i]
+    else:
+        base = size
+        quote = prev_quote + (size - prev_base) * prices[i]
+
+    avg_price = quote / base
+    return {
+        'avg_price': float(avg_price),
+        'best_price': float(prices[0]),
+        'slippage': float(abs(avg_price - prices[0]) / prices[0] * 100),
+        'levels': i + 1
+    }
+
+
+def max_size_within(book, side, max_slippage, size_in_quote=False):
+    """Largest order size whose slippage stays within max_slippage (%)"""
+    prices, cum_base, cum_quote = _depth(book, side)
+    if not len(prices):
+        return 0.0
+
+    best = prices[0]
+    target = best * (1 + max_slippage / 100) if side.upper() == 'BUY' else best * (1 - max_slippage / 100)
+
+    # Slippage after fully consuming each level is monotonic, find the last level within the limit
+    slippage = np.abs(cum_quote / cum_base - best) / best * 100
+    k = int(np.searchsorted(slippage, max_slippage, side='right')) - 1
+    if k + 1 >= len(prices):
+        return float(cum_quote[-1] if size_in_quote else cum_base[-1])
+
+    # Solve for the partial fill x of the next level where the average price reaches the target
+    x = (target * cum_base[k] - cum_quote[k]) / (prices[k + 1] - target)
+    x = min(max(x, 0.0), cum_base[k + 1] - cum_base[k])
+    base = cum_base[k] + x
+    quote = cum_quote[k] + prices[k + 1] * x
+    return float(quote if size_in_quote else base)
+
+
+def plan_child_orders(book, side, size, size_in_quote=False, max_slippage=0.5, max_children=5, min_size=0.0):
+    """
+    Split an order into equal child orders when its estimated slippage exceeds max_slippage (%).
+    Returns the list of child sizes (a single entry if no split is needed or possible, none if size <= 0).
+    """
+    if size <= 0:
+        return []
+
+    estimate = estimate_fill(book, side, size, size_in_quote)
+    if estimate is not None and estimate['slippage'] <= max_slippage:
+        return [size]
+
+    max_child = max_size_within(book, side, max_slippage, size_in_quote)
+    if max_child <= 0:
+        return [size]
+
+    children = min(math.ceil(size / max_child), max_children)
+    if min_size:
+        children = max(min(children, int(size // min_size)), 1)
+    return [size / children] * children
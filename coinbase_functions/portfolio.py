@@ -0,0 +1,153 @@
+import time
+
+
+class MarketInfo:
+    """Price snapshot for the market a holding is valued in"""
+    __slots__ = ('symbol', 'price', 'change_24h', 'status')
+
+    def __init__(self, symbol, price, change_24h=None, status=None):
+        self.symbol = symbol
+        self.price = price
+        self.change_24h = change_24h
+        self.status = status
+
+    def to_dict(self):
+        return {
+            'symbol': self.symbol,
+            'price': self.price,
+            'change_24h': self.change_24h,
+            'status': self.status
+        }
+
+
+class CandleSeries:
+    """Candles for one product, fetched on first access and shared by reference"""
+    __slots__ = ('symbol', '_loader', '_candles')
+
+    def __init__(self, symbol, loader, candles=None):
+        self.symbol = symbol
+        self._loader = loader
+        self._candles = candles  # Already fetched candles, if any
+
+    @property
+    def candles(self):
+        return self.load()
+
+    def load(self, **kwargs):
+        """Candles, fetching them first (passing kwargs such as a timeout to the loader) if needed"""
+        if self._candles is None:
+            self._candles = self._loader(self.symbol, **kwargs)
+        return self._candles
+
+    @property
+    def cached(self):
+        """Candles if already loaded, None otherwise (never fetches)"""
+        return self._candles
+
+    @property
+    def loaded(self):
+        return self._candles is not None
+
+    def reset(self):
+        """Forget the loaded candles, so the next access fetches them again"""
+        self._candles = None
+
+    def __len__(self):
+        return len(self.candles)
+
+    def __iter__(self):
+        return iter(self.candles)
+
+    def __getitem__(self, index):
+        return self.candles[index]
+
+
+class CandleStore:
+    """
+    One CandleSeries per product per candle period, so holdings and the market scan
+    share a single fetch (and a single list) for the same product. A fetch that came
+    back empty (e.g. a failed request) is retried at most once per period.
+    """
+
+    def __init__(self, loader, period=900):
+        self.loader = loader
+        self.period = period
+        self._period_start = None
+        self._series = {}
+        self._retried = set()
+
+    def series(self, symbol):
+        period_start = int(time.time() // self.period)
+        if period_start != self._period_start:
+            self._period_start = period_start
+            self._series = {}
+            self._retried = set()
+
+        series = self._series.get(symbol)
+        if series is None:
+            series = self._series[symbol] = CandleSeries(symbol, self.loader)
+        elif series.cached == [] and symbol not in self._retried:
+            self._retried.add(symbol)
+            series.reset()
+        return series
+
+    def put(self, symbol, candles):
+        """Share candles fetched elsewhere (e.g. by scanner workers), unless the product already has some"""
+        series = self.series(symbol)
+        if not series.loaded:
+            series._candles = candles
+
+    def cached(self, symbol):
+        """Candles already loaded for a product this period, None otherwise (never fetches)"""
+        if int(time.time() // self.period) != self._period_start:
+            return None
+        series = self._series.get(symbol)
+        return series.cached if series is not None else None
+
+
+class Holding:
+    """A non-zero balance in the portfolio"""
+    __slots__ = ('currency', 'coin_amount', 'usd_value', 'entry_price', 'current_price',
+                 'market_data', 'transactions', 'candles')
+
+    def __init__(self, currency, coin_amount, entry_price=None, market_data=None,
+                 transactions=None, candles=None):
+        self.currency = currency
+        self.coin_amount = coin_amount
+        self.entry_price = entry_price
+        self.market_data = market_data
+        self.transactions = transactions if transactions is not None else []  # Shared, not copied
+        self.candles = candles
+        self.current_price = market_data.price if market_data else None
+        self.usd_value = coin_amount * self.current_price if self.current_price else None
+
+    @property
+    def symbol(self):
+        return self.market_data.symbol if self.market_data else None
+
+    @property
+    def candle_data(self):
+        return self.candles.candles if self.candles is not None else []
+
+    def to_dict(self, full=False):
+        """
+        Compact serialization for logs and prompts. Candles and transactions are
+        only included with full=True to keep payloads small.
+        """
+        data = {
+            'coin_amount': self.coin_amount,
+            'usd_value': self.usd_value,
+            'entry_price': self.entry_price,
+            'current_price': self.current_price,
+            'symbol': self.symbol,
+            'change_24h': self.market_data.change_24h if self.market_data else None
+        }
+        if full:
+            data['transactions'] = self.transactions
+            data['candle_data'] = self.candle_data
+        return data
+
+
+def portfolio_to_dict(holdings, full=False):
+    """Serialize a {currency: Holding} portfolio"""
+    return {currency: holding.to_dict(full=full) for currency, holding in holdings.items()}
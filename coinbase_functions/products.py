@@ -0,0 +1,95 @@
+import time
+from coinbase_functions.portfolio import MarketInfo
+
+
+def _float(value):
+    return float(value) if value not in (None, '') else None
+
+
+class ProductIndex:
+    """
+    Index of exchange products keyed by base and quote currency.
+
+    Built from the products listing and refreshed in place, so lookups like
+    "the USDC market for SOL" or "the base currency of SOL-USD" are O(1)
+    dictionary hits instead of string splitting and list scans.
+    """
+
+    def __init__(self):
+        self.by_base = {}  # base -> {quote -> product info}
+        self.by_quote = {}  # quote -> {base -> product info}
+        self.by_id = {}  # product_id -> product info
+        self.updated_at = None
+
+    def refresh(self, products):
+        """Update the index from a products listing (list of product dicts)"""
+        seen = set()
+        for product in products:
+            product_id = product['product_id']
+            base = product.get('base_currency_id') or product_id.split('-')[0]
+            quote = product.get('quote_currency_id') or product_id.split('-')[1]
+            seen.add(product_id)
+
+            fields = {
+                'product_id': product_id,
+                'base': base,
+                'quote': quote,
+                'price': _float(product.get('price')),
+                'change_24h': _float(product.get('price_percentage_change_24h')),
+                'volume_24h': _float(product.get('volume_24h')),
+                'status': product.get('status'),
+                'is_disabled': product.get('is_disabled', False),
+                'base_increment': _float(product.get('base_increment')),
+                'quote_increment': _float(product.get('quote_increment')),
+                'base_min_size': _float(product.get('base_min_size')),
+                'quote_min_size': _float(product.get('quote_min_size')),
+            }
+
+            info = self.by_id.get(product_id)
+            if info is None:
+                self.by_id[product_id] = fields
+                self.by_base.setdefault(base, {})[quote] = fields
+                self.by_quote.setdefault(quote, {})[base] = fields
+            else:
+                info.update(fields)
+
+        # Drop delisted products
+        for product_id in [product_id for product_id in self.by_id if product_id not in seen]:
+            info = self.by_id.pop(product_id)
+            self.by_base[info['base']].pop(info['quote'], None)
+            self.by_quote[info['quote']].pop(info['base'], None)
+
+        self.updated_at = time.time()
+
+    def get(self, base, quote):
+        """Get the product info for a base/quote pair, or None"""
+        return self.by_base.get(base, {}).get(quote)
+
+    def lookup(self, product_id):
+        """Get the product info for a product ID, or None"""
+        return self.by_id.get(product_id)
+
+    def quotes(self, base):
+        """All markets for a base currency, keyed by quote currency"""
+        return self.by_base.get(base, {})
+
+    def products(self, quote):
+        """All products quoted in the given currency"""
+        return list(self.by_quote.get(quote, {}).values())
+
+    def base_of(self, product_id):
+        """Base currency of a product ID"""
+        info = self.lookup(product_id)
+        return info['base'] if info else product_id.split('-')[0]
+
+    def quote_of(self, product_id):
+        """Quote currency of a product ID"""
+        info = self.lookup(product_id)
+        return info['quote'] if info else product_id.split('-')[-1]
+
+    def market_info(self, base, quote):
+        """MarketInfo for a base/quote pair, None if it has no price"""
+        info = self.get(base, quote)
+        if not info or not info['price']:
+            return None
+        return MarketInfo(info['product_id'], info['price'], info['change_24h'], info['status'])
@@ -0,0 +1,174 @@
+import os
+import sys
+import io
+import time
+import signal
+import cProfile
+import pstats
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class CycleProfiler:
+    """
+    On-demand profiler for the trading loop. Profiling of the next N cycles is
+    switched on without a restart by either:
+      - sending SIGUSR1 to the process (profiles `signal_cycles` cycles), or
+      - creating the control file, optionally containing the number of cycles.
+
+    While active each cycle gets a statistical stack sampler (collapsed stacks,
+    ready for flamegraph.pl / speedscope) and a cProfile per stage. When off,
+    the only cost is one file existence check per cycle.
+    """
+
+    def __init__(self, output_dir='trade_logs/profiles', control_file='trade_logs/PROFILE',
+                 interval=0.005, signal_cycles=3, top_n=25):
+        self.output_dir = output_dir
+        self.control_file = control_file
+        self.interval = interval
+        self.signal_cycles = signal_cycles
+        self.top_n = top_n
+
+        self._remaining = 0
+        self._active = False
+        self._stage = None
+        self._stage_times = {}
+        self._profiles = {}
+        self._samples = Counter()
+        self._stop = threading.Event()
+        self._sampler = None
+        self._thread_id = None
+
+    def request(self, cycles):
+        """Profile the next number of cycles"""
+        self._remaining = max(self._remaining, int(cycles))
+
+    def install_signal_handler(self, signum=None):
+        """Profile the next cycles when the process receives SIGUSR1"""
+        signum = signum or getattr(signal, 'SIGUSR1', None)
+        if signum is None:  # Not available on Windows, use the control file instead
+            return
+        signal.signal(signum, lambda *_: self.request(self.signal_cycles))
+
+    def _check_control_file(self):
+        if not os.path.exists(self.control_file):
+            return
+        try:
+            with open(self.control_file) as f:
+                content = f.read().strip()
+            os.remove(self.control_file)
+        except OSError as e:
+            print(f"Failed to read profiling control file: {e}")
+            return
+
+        try:
+            self.request(int(content) if content else 1)
+        except ValueError:
+            self.request(1)
+
+    @contextmanager
+    def cycle(self):
+        """Wrap one iteration of the trading loop"""
+        self._check_control_file()
+        if self._remaining <= 0:
+            yield
+            return
+
+        self._remaining -= 1
+        self._start()
+        started = datetime.now()
+        try:
+            yield
+        finally:
+            self._finish(started)
+
+    @contextmanager
+    def stage(self, name):
+        """Tag the work inside the block with a stage name"""
+        if not self._active:
+            yield
+            return
+
+        previous = self._stage
+        self._switch_profile(previous, name)
+        self._stage = name
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._stage_times[name] = self._stage_times.get(name, 0.0) + time.perf_counter() - start
+            self._switch_profile(name, previous)
+            self._stage = previous
+
+    def _switch_profile(self, old, new):
+        self._profiles[old].disable()
+        if new not in self._profiles:
+            self._profiles[new] = cProfile.Profile()
+        self._profiles[new].enable()
+
+    def _start(self):
+        self._active = True
+        self._stage = None
+        self._stage_times = {}
+        self._samples = Counter()
+        self._profiles = {None: cProfile.Profile()}
+        self._profiles[None].enable()
+
+        self._thread_id = threading.get_ident()
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self._samples[';'.join([self._stage or 'cycle'] + stack[::-1])] += 1
+
+    def _finish(self, started):
+        self._stop.set()
+        self._sampler.join()
+        self._profiles[self._stage].disable()
+        self._active = False
+
+        try:
+            self._write(started)
+        except OSError as e:
+            print(f"Failed to write cycle profile: {e}")
+
+    def _write(self, started):
+        os.makedirs(self.output_dir, exist_ok=True)
+        prefix = os.path.join(self.output_dir, started.strftime('%Y-%m-%d_%H-%M-%S'))
+
+        with open(f"{prefix}.collapsed", 'w') as f:
+            for stack, count in self._samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+        with open(f"{prefix}_top.txt", 'w') as f:
+            f.write(f"=== Cycle {started.strftime('%Y-%m-%d_%H-%M-%S')} ===\n")
+            f.write(f"Samples: {sum(self._samples.values())} (every {self.interval * 1000:.0f} ms)\n\n")
+            f.write("Stage wall times:\n")
+            for name, seconds in sorted(self._stage_times.items(), key=lambda x: x[1], reverse=True):
+                f.write(f"  {name}: {seconds:.3f}s\n")
+
+            for name, profile in self._profiles.items():
+                stream = io.StringIO()
+                try:
+                    stats = pstats.Stats(profile, stream=stream)
+                except TypeError:  # Nothing was recorded for this stage
+                    continue
+                stats.sort_stats('cumulative').print_stats(self.top_n)
+                f.write(f"\n=== Stage: {name or 'cycle'} ===\n")
+                f.write(stream.getvalue())
+
+        print(f"Cycle profile written to {prefix}.collapsed and {prefix}_top.txt")
+
+
+profiler = CycleProfiler()
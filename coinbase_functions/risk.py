@@ -0,0 +1,161 @@
+import numpy as np
+
+
+def candle_returns(candles):
+    """Closed-candle log returns as (times, returns), None if there are too few valid candles"""
+    if not candles or len(candles) < 3:
+        return None
+
+    # The newest candle is still forming, only use closed ones
+    ordered = sorted(candles, key=lambda candle: candle['time'])[:-1]
+    times = np.array([candle['time'] for candle in ordered])
+    closes = np.array([candle['close'] for candle in ordered], dtype=float)
+    if np.any(closes <= 0):
+        return None
+
+    return times[1:], np.diff(np.log(closes))
+
+
+class RollingCovariance:
+    """
+    Exponentially weighted covariance of 15-minute log returns across the tracked universe.
+
+    Each closed candle period is folded in with a rank-one update, so a new candle
+    costs O(n^2) instead of recomputing the full matrix from history. A product that
+    joins later gets its row seeded from the returns it shares with the tracked ones,
+    and pairs with too few joint observations are sized as fully correlated.
+    """
+
+    def __init__(self, halflife=96, window=192, min_joint=24):  # 96 candles = 1 day of 15-minute candles
+        self.alpha = 1 - 0.5 ** (1 / halflife)
+        self.window = window  # Recent returns kept per product to seed products added later
+        self.min_joint = min_joint  # Joint observations needed before a correlation is trusted
+        self.index = {}  # product_id -> row in mean/cov
+        self.mean = np.zeros(0)
+        self.cov = np.zeros((0, 0))
+        self.joint = np.zeros((0, 0), dtype=int)  # Periods each pair was observed together
+        self.history = {}  # product_id -> (times, returns), the last `window` returns
+        self.last_time = None  # Most recent candle time folded into the matrix
+        self._pending = {}  # candle time -> {row: return}
+
+    def _add_product(self, product_id, seed_times, seed_returns):
+        """
+        Grow the matrix for a new product. Its variance is seeded from its own history, and its
+        covariance with each tracked product from their overlapping returns.
+        """
+        idx = len(self.index)
+        self.index[product_id] = idx
+        self.mean = np.append(self.mean, 0.0)
+        self.cov = np.pad(self.cov, ((0, 1), (0, 1)))
+        self.joint = np.pad(self.joint, ((0, 1), (0, 1)))
+
+        if len(seed_returns) < 2:
+            return idx
+        self.mean[idx] = np.mean(seed_returns)
+        self.cov[idx, idx] = np.var(seed_returns)
+
+        for other, (times, returns) in self.history.items():
+            j = self.index.get(other)
+            if j is None or j == idx:
+                continue
+            _, mine, theirs = np.intersect1d(seed_times, times, assume_unique=True, return_indices=True)
+            if len(mine) < 2:
+                continue
+            a, b = seed_returns[mine], returns[theirs]
+            if np.std(a) > 0 and np.std(b) > 0:
+                # Scale the sample correlation by the current variances, so the seeded row stays consistent
+                rho = np.corrcoef(a, b)[0, 1]
+                self.cov[idx, j] = self.cov[j, idx] = rho * np.sqrt(self.cov[idx, idx] * self.cov[j, j])
+            self.joint[idx, j] = self.joint[j, idx] = len(mine)
+        return idx
+
+    def observe(self, product_id, candles):
+        """Queue the closed-candle returns for a product that have not been folded in yet"""
+        returns = candle_returns(candles)
+        if returns is not None:
+            self.observe_returns(product_id, *returns)
+
+    def observe_returns(self, product_id, times, returns):
+        """Queue closed-candle returns (from candle_returns) that have not been folded in yet"""
+        if self.last_time is None:
+            newer = np.ones(len(times), dtype=bool)
+        else:
+            newer = times > self.last_time
+
+        idx = self.index.get(product_id)
+        if idx is None:
+            idx = self._add_product(product_id, times[~newer], returns[~newer])
+        self.history[product_id] = (times[-self.window:], returns[-self.window:])
+
+        for candle_time, candle_return in zip(times[newer], returns[newer]):
+            self._pending.setdefault(int(candle_time), {})[idx] = float(candle_return)
+
+    def commit(self):
+        """Fold all queued candle periods into the mean and covariance, oldest first"""
+        for candle_time in sorted(self._pending):
+            observed = self._pending.pop(candle_time)
+            rows = np.fromiter(observed.keys(), dtype=int, count=len(observed))
+            returns = np.fromiter(observed.values(), dtype=float, count=len(observed))
+
+            diff = returns - self.mean[rows]
+            self.mean[rows] += self.alpha * diff
+
+            # Rank-one update, restricted to the products observed in this period
+            update = (1 - self.alpha) * self.alpha * np.outer(diff, diff)
+            if len(rows) == len(self.mean):
+                self.cov *= (1 - self.alpha)
+                self.cov += update
+                self.joint += 1
+            else:
+                block = np.ix_(rows, rows)
+                self.cov[block] = (1 - self.alpha) * self.cov[block] + update
+                self.joint[block] += 1
+
+            self.last_time = candle_time
+
+    def correlations(self, product_id, others):
+        """
+        Correlation of a product's returns with each of the other products. Pairs without
+        enough joint observations (including unknown products) count as fully correlated.
+        """
+        self.commit()
+        others = list(others)
+        result = {other: 1.0 for other in others}
+
+        i = self.index.get(product_id)
+        known = [other for other in others if other in self.index]
+        if i is None or not known:
+            return result
+
+        rows = np.array([self.index[other] for other in known])
+        variances = np.diag(self.cov)
+        denom = np.sqrt(variances[i] * variances[rows])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rho = np.where(denom > 0, np.clip(self.cov[i, rows] / denom, -1.0, 1.0), 0.0)
+        rho = np.where(self.joint[i, rows] >= self.min_joint, rho, 1.0)
+
+        result.update(zip(known, rho.tolist()))
+        return result
+
+    def correlated_exposure(self, product_id, exposures):
+        """USD exposure already held in products positively correlated with this one"""
+        rho = self.correlations(product_id, exposures.keys())
+        exposure = 0.0
+        for other, amount in exposures.items():
+            if other == product_id:
+                exposure += amount
+            else:
+                exposure += max(rho[other], 0.0) * amount
+        return exposure
+
+    def size_buy(self, product_id, exposures, base_amount=25, min_amount=10, max_correlated_exposure=100):
+        """
+        Size a buy so that exposure to correlated products stays under the cap.
+        Returns 0 if the remaining room is below the minimum order amount.
+        """
+        room = max_correlated_exposure - self.correlated_exposure(product_id, exposures)
+        amount = round(min(base_amount, room), 2)
+        return amount if amount >= min_amount else 0
+
+
+risk_model = RollingCovariance()
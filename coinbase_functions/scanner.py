@@ -0,0 +1,186 @@
+import os
+import time
+import heapq
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from coinbase_functions.indicators import indicator_engine
+from coinbase_functions.risk import candle_returns
+from coinbase_functions.strategy import SHADOW_STRATEGIES, score_buy
+
+_executor = None
+_executor_workers = None
+_throttle = None  # Set in each worker process by _init_worker
+
+# Extra time past the deadline for a shard to finish its in-flight fetch and send back results (seconds)
+RESULT_GRACE = 5
+
+# Candle requests per second across all workers, below the public API's per-IP limit
+MAX_REQUESTS_PER_SECOND = 8
+
+
+class Throttle:
+    """Spaces out calls across processes to at most `rate` per second"""
+
+    def __init__(self, rate, context=multiprocessing):
+        self.interval = 1 / rate
+        self._next = context.Value('d', 0.0)  # Earliest time the next call may start
+
+    def wait(self):
+        with self._next.get_lock():
+            now = time.time()
+            start = max(now, self._next.value)
+            self._next.value = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def _init_worker(throttle):
+    global _throttle
+    _throttle = throttle
+
+
+def get_executor(workers):
+    """Worker pool kept alive across cycles, so processes are only spawned once"""
+    global _executor, _executor_workers
+    if _executor is None or _executor_workers != workers:
+        reset_executor()
+        # Spawn instead of fork: the main process already runs threads (e.g. the fill tracker),
+        # and forking while one of them holds a lock can deadlock the child
+        context = multiprocessing.get_context('spawn')
+        _executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(Throttle(MAX_REQUESTS_PER_SECOND, context),)
+        )
+        _executor_workers = workers
+    return _executor
+
+
+def reset_executor():
+    """Drop the worker pool (e.g. after a worker died), the next get_executor builds a new one"""
+    global _executor, _executor_workers
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+    _executor = None
+    _executor_workers = None
+
+
+def partition(items, shards):
+    """Deal ranked items round-robin, so every shard gets a share of the highest ranked ones"""
+    return [items[i::shards] for i in range(shards) if items[i::shards]]
+
+
+def scan_shard(shard, fetch, strategies=SHADOW_STRATEGIES, top_k=10, deadline=None):
+    """
+    Fetch, decode and score one shard of (rank, candidate) pairs in a worker process.
+
+    Every candidate is scored under each strategy's buy config (indicators are computed once).
+    Candidates that already carry candle_data (e.g. held products) are not fetched again,
+    fetches share the pool's throttle and failed (empty) fetches count as skipped.
+    Returns the local top-K ranks per strategy as {name: [((score, -rank), rank)]}, the
+    candidates in any of them by rank (with candle_data), the symbols skipped (at the deadline or failed)
+    and the closed-candle returns of every fetched product for the risk model.
+    """
+    scored = {name: [] for name in strategies}
+    assets = {}
+    skipped = []
+    returns = {}
+    for rank, asset in shard:
+        if deadline and time.time() >= deadline:
+            skipped.append(asset['symbol'])
+            continue
+
+        candles = asset.get('candle_data')
+        if not candles:
+            if _throttle is not None:
+                _throttle.wait()
+                if deadline and time.time() >= deadline:
+                    skipped.append(asset['symbol'])
+                    continue
+            candles = fetch(asset['symbol'], timeout=deadline - time.time()) if deadline else fetch(asset['symbol'])
+        if not candles:
+            skipped.append(asset['symbol'])
+            continue
+
+        product_returns = candle_returns(candles)
+        if product_returns is not None:
+            returns[asset['symbol']] = product_returns
+
+        try:
+            indicators = indicator_engine.for_product(asset['symbol'], candles, current_price=float(asset['price']))
+            scores = {
+                name: score_buy(indicators, float(asset['change_24h']), strategy['buy'])[0]
+                for name, strategy in strategies.items()
+            }
+        except (ValueError, TypeError, KeyError) as e:
+            print(f"Error analyzing {asset['symbol']}: {str(e)}")
+            continue
+
+        for name, score in scores.items():
+            if score >= strategies[name]['buy']['min_score']:
+                # Ties keep the coordinator's ranking
+                scored[name].append(((score, -rank), rank))
+                assets[rank] = dict(asset, candle_data=candles)
+
+    tops = {name: heapq.nlargest(top_k, entries, key=lambda x: x[0]) for name, entries in scored.items()}
+    kept = {rank for entries in tops.values() for _, rank in entries}
+    return tops, {rank: asset for rank, asset in assets.items() if rank in kept}, skipped, returns
+
+
+def scan_market(candidates, fetch, strategies=SHADOW_STRATEGIES, workers=None, top_k=None, deadline=None):
+    """
+    Shard ranked candidates across worker processes and merge each shard's top-K.
+
+    Workers only send back the best candidates (with candles) of every strategy in
+    `strategies`, so the live strategy and each shadow variant get their own top-K and
+    the coordinator's work stays constant as the universe grows. Candidates no strategy
+    would buy are dropped. Returns (candidates in their original ranking, skipped symbols,
+    {symbol: (times, returns)} of every fetched product).
+    """
+    workers = workers or os.cpu_count() or 1
+    # Extra room per shard so the global top still fills up when risk sizing drops some
+    top_k = top_k or max(strategy['max_actions'] for strategy in strategies.values()) * 2
+
+    shards = partition(list(enumerate(candidates)), workers)
+    if not shards:
+        return [], [], {}
+
+    try:
+        futures = [get_executor(workers).submit(scan_shard, shard, fetch, strategies, top_k, deadline) for shard in shards]
+    except BrokenProcessPool:
+        # A worker died since the last cycle, start over with a fresh pool
+        reset_executor()
+        futures = [get_executor(workers).submit(scan_shard, shard, fetch, strategies, top_k, deadline) for shard in shards]
+
+    tops = {name: [] for name in strategies}
+    assets = {}
+    skipped = []
+    returns = {}
+    broken = False
+    for shard, future in zip(shards, futures):
+        try:
+            timeout = max(deadline + RESULT_GRACE - time.time(), 0) if deadline else None
+            shard_tops, shard_assets, shard_skipped, shard_returns = future.result(timeout=timeout)
+        except TimeoutError:
+            future.cancel()
+            skipped.extend(asset['symbol'] for _, asset in shard)
+            continue
+        except BrokenProcessPool:
+            # A worker died, the shard is lost for this cycle
+            broken = True
+            skipped.extend(asset['symbol'] for _, asset in shard)
+            continue
+        for name, entries in shard_tops.items():
+            tops[name].extend(entries)
+        assets.update(shard_assets)
+        skipped.extend(shard_skipped)
+        returns.update(shard_returns)
+
+    if broken:
+        print("Scanner worker pool broke, starting a new one next cycle")
+        reset_executor()
+
+    kept = {rank for entries in tops.values() for _, rank in heapq.nlargest(top_k, entries, key=lambda x: x[0])}
+    return [assets[rank] for rank in sorted(kept)], skipped, returns
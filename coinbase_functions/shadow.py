@@ -0,0 +1,145 @@
+import os
+import json
+from datetime import datetime
+from coinbase_functions.portfolio import CandleSeries, Holding, MarketInfo
+from coinbase_functions.strategy import SHADOW_STRATEGIES, select_buy_opportunities, select_sell_opportunities
+
+
+class ShadowRunner:
+    """
+    Runs strategy variants in shadow mode on the snapshot the live strategy already fetched.
+
+    Each variant keeps a virtual book (seeded from the real holdings on the first run),
+    trades it hypothetically at the snapshot prices and logs its actions and gross PnL.
+    Indicators come from the shared indicator engine, so a variant only costs its
+    scoring step and never makes an API call. Virtual positions outside this cycle's
+    market data are repriced from the product index, with whatever candles the candle
+    store already holds.
+    """
+
+    def __init__(self, strategies=SHADOW_STRATEGIES, log_dir='trade_logs/shadow', funding_currency='USDC'):
+        self.strategies = strategies
+        self.log_dir = log_dir
+        self.funding_currency = funding_currency
+        self.books = {}
+
+    def _snapshot(self, market_data, account_data, product_index=None, candle_store=None):
+        """Market info and candles (possibly empty) per product from the data fetched this cycle"""
+        snapshot = {}
+        for asset in market_data:
+            if asset.get('candle_data'):
+                market_info = MarketInfo(asset['symbol'], asset['price'], asset['change_24h'], asset['status'])
+                snapshot[asset['symbol']] = (market_info, asset['candle_data'])
+        for holding in account_data.values():
+            # Only use candles that were already loaded, loading them here would be an API call
+            candles = holding.candles.cached if holding.candles is not None else None
+            if holding.symbol and candles:
+                snapshot.setdefault(holding.symbol, (holding.market_data, candles))
+
+        # Virtual positions the scan didn't cover still need a price, so they can be valued and sold
+        if product_index is not None:
+            for book in self.books.values():
+                for symbol in book['positions']:
+                    if symbol in snapshot:
+                        continue
+                    market_info = product_index.market_info(product_index.base_of(symbol), product_index.quote_of(symbol))
+                    if market_info is None:
+                        continue
+                    candles = candle_store.cached(symbol) if candle_store is not None else None
+                    snapshot[symbol] = (market_info, candles or [])
+        return snapshot
+
+    def _seed(self, account_data):
+        positions = {}
+        for currency, holding in account_data.items():
+            if currency == self.funding_currency or not holding.symbol or not holding.current_price:
+                continue
+            positions[holding.symbol] = {
+                'units': holding.coin_amount,
+                'entry_price': holding.entry_price or holding.current_price,
+                'last_price': holding.current_price
+            }
+        return {'positions': positions, 'realized_pnl': 0.0}
+
+    def run(self, market_data, account_data, product_index=None, candle_store=None):
+        """
+        Evaluate every variant on this cycle's snapshot and log the results.
+        product_index and candle_store (optional) reprice positions missing from market_data.
+        """
+        for name in self.strategies:
+            if name not in self.books:
+                self.books[name] = self._seed(account_data)
+
+        snapshot = self._snapshot(market_data, account_data, product_index, candle_store)
+        timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+        results = {}
+
+        for name, strategy in self.strategies.items():
+            try:
+                results[name] = self._run_variant(self.books[name], strategy, market_data, snapshot)
+                self._log(name, timestamp, results[name])
+            except Exception as e:
+                print(f"Error running shadow strategy {name}: {str(e)}")
+
+        return results
+
+    def _run_variant(self, book, strategy, market_data, snapshot):
+        positions = book['positions']
+
+        # Virtual holdings that have fresh data in the snapshot
+        holdings = {}
+        for symbol, position in positions.items():
+            if symbol not in snapshot:
+                continue
+            # Snapshot candles were already loaded (possibly empty), so the series never needs a loader
+            market_info, candles = snapshot[symbol]
+            position['last_price'] = market_info.price
+            holdings[symbol] = Holding(
+                symbol,
+                position['units'],
+                entry_price=position['entry_price'],
+                market_data=market_info,
+                candles=CandleSeries(symbol, None, candles)
+            )
+
+        sell_actions = select_sell_opportunities(holdings, strategy)
+        exposures = {symbol: position['units'] * position['last_price'] for symbol, position in positions.items()}
+        buy_actions = select_buy_opportunities(market_data, strategy, exposures)
+
+        # Fill hypothetically at the snapshot prices
+        for action in sell_actions:
+            position = positions.pop(action['product_id'])
+            book['realized_pnl'] += position['units'] * (position['last_price'] - position['entry_price'])
+
+        for action in buy_actions:
+            price = snapshot[action['product_id']][0].price
+            units = action['amount'] / price
+            position = positions.get(action['product_id'])
+            if position is None:
+                positions[action['product_id']] = {'units': units, 'entry_price': price, 'last_price': price}
+            else:
+                total_units = position['units'] + units
+                position['entry_price'] = (position['units'] * position['entry_price'] + units * price) / total_units
+                position['units'] = total_units
+                position['last_price'] = price
+
+        unrealized_pnl = sum(
+            position['units'] * (position['last_price'] - position['entry_price'])
+            for position in positions.values()
+        )
+        return {
+            'actions': buy_actions + sell_actions,
+            'realized_pnl': round(book['realized_pnl'], 4),
+            'unrealized_pnl': round(unrealized_pnl, 4),
+            'total_pnl': round(book['realized_pnl'] + unrealized_pnl, 4),
+            'open_positions': len(positions)
+        }
+
+    def _log(self, name, timestamp, result):
+        os.makedirs(self.log_dir, exist_ok=True)
+        with open(os.path.join(self.log_dir, f'{name}.txt'), 'a') as f:
+            f.write(f"\n\n=== {timestamp} ===\n")
+            f.write(json.dumps(result, indent=2))
+
+
+shadow_runner = ShadowRunner()
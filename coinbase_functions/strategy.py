@@ -0,0 +1,255 @@
+import copy
+from coinbase_functions.indicators import indicator_engine
+from coinbase_functions.risk import risk_model
+
+# Weights and thresholds of the live scoring system (0-100 points per side)
+LIVE_STRATEGY = {
+    'buy': {
+        'change_threshold': -5.0,  # 24h change at or below this counts as a price drop
+        'change_points': 30,
+        'rsi_oversold': 30,
+        'rsi_points': 25,
+        'ma_points': 25,
+        'volume_points': 20,
+        'min_score': 60
+    },
+    'sell': {
+        'profit_threshold': 3.0,
+        'profit_points': 30,
+        'partial_profit_points': 15,  # Half of threshold still gets some points
+        'rsi_overbought': 70,
+        'rsi_overbought_points': 25,
+        'rsi_high': 65,
+        'rsi_high_points': 15,
+        'uptrend_points': 25,
+        'above_ma20_points': 15,
+        'strong_momentum': 1.5,
+        'strong_momentum_points': 20,
+        'moderate_momentum': 0.75,
+        'moderate_momentum_points': 10,
+        'min_score': 50
+    },
+    'max_actions': 5
+}
+
+
+def make_strategy(base=LIVE_STRATEGY, buy=None, sell=None, **overrides):
+    """Copy a strategy, overriding some of its buy/sell weights or top level settings"""
+    strategy = copy.deepcopy(base)
+    strategy['buy'].update(buy or {})
+    strategy['sell'].update(sell or {})
+    strategy.update(overrides)
+    return strategy
+
+
+# Variants evaluated in shadow mode alongside the live strategy
+SHADOW_STRATEGIES = {
+    'live': LIVE_STRATEGY,
+    'loose_buy': make_strategy(buy={'min_score': 50}),
+    'deep_dip': make_strategy(buy={'change_threshold': -8.0, 'rsi_oversold': 25}),
+    'quick_profit': make_strategy(sell={'profit_threshold': 2.0, 'min_score': 45}),
+}
+
+
+def score_buy(indicators, change_24h, config):
+    """Score a buy candidate from its indicators, returns (score, reasons)"""
+    score = 0
+    reasons = []
+    current_price = indicators['current_price']
+    rsi = indicators['rsi']
+    ma20, ma50 = indicators['ma20'], indicators['ma50']
+
+    # Price drop criterion
+    if change_24h <= config['change_threshold']:
+        score += config['change_points']
+        reasons.append(f"✓ Price drop (+{config['change_points']} points)")
+
+    # RSI criterion
+    if rsi is not None and rsi < config['rsi_oversold']:
+        score += config['rsi_points']
+        reasons.append(f"✓ RSI oversold (+{config['rsi_points']} points)")
+
+    # Moving Average criterion
+    if ma20 and ma50 and current_price:
+        if current_price < ma20 < ma50:
+            score += config['ma_points']
+            reasons.append(f"✓ Below falling MAs (+{config['ma_points']} points)")
+
+    # Volume criterion
+    if indicators['volume_spike']:
+        score += config['volume_points']
+        reasons.append(f"✓ Volume spike (+{config['volume_points']} points)")
+
+    return score, reasons
+
+
+def score_sell(indicators, config):
+    """Score a holding for selling from its indicators, returns (score, reasons)"""
+    score = 0
+    reasons = []
+    current_price = indicators['current_price']
+    profit_percentage = indicators['profit_percentage']
+    rsi = indicators['rsi']
+    ma20, ma50 = indicators['ma20'], indicators['ma50']
+    price_momentum = indicators['price_momentum']
+
+    # Profit threshold scoring
+    if profit_percentage >= config['profit_threshold']:
+        score += config['profit_points']
+        reasons.append(f"✓ Profit threshold met (+{config['profit_points']} points)")
+    elif profit_percentage >= (config['profit_threshold'] * 0.5):
+        score += config['partial_profit_points']
+        reasons.append(f"✓ Partial profit threshold met (+{config['partial_profit_points']} points)")
+
+    # RSI scoring
+    if rsi is not None:
+        if rsi > config['rsi_overbought']:
+            score += config['rsi_overbought_points']
+            reasons.append(f"✓ RSI overbought condition met (+{config['rsi_overbought_points']} points)")
+        elif rsi > config['rsi_high']:
+            score += config['rsi_high_points']
+            reasons.append(f"✓ RSI approaching overbought (+{config['rsi_high_points']} points)")
+
+    # Moving average trend scoring
+    if ma20 and ma50 and current_price:
+        if current_price > ma20 > ma50:
+            score += config['uptrend_points']
+            reasons.append(f"✓ Strong uptrend detected (+{config['uptrend_points']} points)")
+        elif current_price > ma20:
+            score += config['above_ma20_points']
+            reasons.append(f"✓ Above MA20 (+{config['above_ma20_points']} points)")
+
+    # Price momentum scoring
+    if price_momentum is not None:
+        if price_momentum > config['strong_momentum']:
+            score += config['strong_momentum_points']
+            reasons.append(f"✓ Strong price momentum (+{config['strong_momentum_points']} points)")
+        elif price_momentum > config['moderate_momentum']:
+            score += config['moderate_momentum_points']
+            reasons.append(f"✓ Moderate price momentum (+{config['moderate_momentum_points']} points)")
+
+    return score, reasons
+
+
+def select_buy_opportunities(market_data, strategy=LIVE_STRATEGY, exposures=None, verbose=False):
+    """
+    Score market data and pick the top buys, sized by correlation with current
+    exposures (USD per product). Makes no API calls.
+    """
+    config = strategy['buy']
+    all_opportunities = []
+    for asset in market_data:
+        try:
+            symbol = asset['symbol']
+            current_price = float(asset['price'])
+            change_24h = float(asset['change_24h'])
+            candle_data = asset.get('candle_data', [])
+
+            # Skip if no candle data
+            if not candle_data:
+                continue
+
+            indicators = indicator_engine.for_product(symbol, candle_data, current_price=current_price)
+            score, _ = score_buy(indicators, change_24h, config)
+
+            # If score is high enough, add to opportunities list
+            if score >= config['min_score']:
+                rsi = indicators['rsi']
+                rsi_str = f"{rsi:.1f}" if rsi is not None else "N/A"
+                reason = f'Buy score: {score}/100. Change: {change_24h:.2f}%, RSI: {rsi_str}'
+
+                all_opportunities.append({
+                    'product_id': symbol,
+                    'side': 'BUY',
+                    'reason': reason,
+                    'score': score  # Add score for sorting
+                })
+
+        except (ValueError, TypeError, KeyError) as e:
+            if verbose:
+                print(f"Error analyzing {asset.get('symbol', 'unknown')}: {str(e)}")
+            continue
+
+    # Take the top buys by score, sizing each against holdings and the buys before it
+    exposures = dict(exposures or {})
+    buy_opportunities = []
+    for opp in sorted(all_opportunities, key=lambda x: x['score'], reverse=True):
+        amount = risk_model.size_buy(opp['product_id'], exposures)
+        if not amount:
+            if verbose:
+                print(f"Skipping {opp['product_id']}: correlated exposure cap reached")
+            continue
+
+        opp['amount'] = amount
+        exposures[opp['product_id']] = exposures.get(opp['product_id'], 0) + amount
+        buy_opportunities.append(opp)
+        if len(buy_opportunities) == strategy['max_actions']:
+            break
+
+    # Remove score from final output
+    for opp in buy_opportunities:
+        del opp['score']
+
+    return buy_opportunities
+
+
+def select_sell_opportunities(holdings, strategy=LIVE_STRATEGY, verbose=False):
+    """Score holdings ({currency: Holding}) and pick the top sells. Makes no API calls."""
+    config = strategy['sell']
+    all_opportunities = []
+
+    for currency, holding in holdings.items():
+        try:
+            if not holding.coin_amount or not holding.current_price:
+                continue
+            if not holding.entry_price:
+                continue
+
+            indicators = indicator_engine.for_holding(holding)
+            if indicators is None:
+                continue
+            score, reasons = score_sell(indicators, config)
+            profit_percentage = indicators['profit_percentage']
+            rsi = indicators['rsi']
+
+            if verbose:
+                ma20, ma50 = indicators['ma20'], indicators['ma50']
+                print(f"\nAnalyzing {currency}:")
+                print(f"Entry Price: {holding.entry_price}")
+                print(f"Current Price: {holding.current_price}")
+                print(f"Profit: {profit_percentage:.2f}%")
+                print(f"RSI: {rsi:.1f}" if rsi is not None else "RSI: N/A")
+                print(f"MA20: {ma20:.2f}" if ma20 is not None else "MA20: N/A")
+                print(f"MA50: {ma50:.2f}" if ma50 is not None else "MA50: N/A")
+                for line in reasons:
+                    print(line)
+                print(f"Final Score: {score}/100")
+
+            if score >= config['min_score']:
+                reason = f'Sell score: {score}/100. Profit: {profit_percentage:.1f}%'
+                if rsi is not None:
+                    reason += f', RSI: {rsi:.1f}'
+                else:
+                    reason += ', RSI: N/A'
+
+                all_opportunities.append({
+                    'product_id': holding.symbol,
+                    'side': 'SELL',
+                    'reason': reason,
+                    'score': score
+                })
+                if verbose:
+                    print("→ Added to sell opportunities!")
+
+        except (ValueError, TypeError, KeyError) as e:
+            if verbose:
+                print(f"Error analyzing {currency}: {str(e)}")
+            continue
+
+    # Sort by score and take the top ones
+    sell_opportunities = sorted(all_opportunities, key=lambda x: x['score'], reverse=True)[:strategy['max_actions']]
+    # Remove score from final output
+    for opp in sell_opportunities:
+        del opp['score']
+
+    return sell_opportunities
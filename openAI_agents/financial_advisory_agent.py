@@ -1,4 +1,5 @@
 from openai import OpenAI
+from coinbase_functions.portfolio import portfolio_to_dict
 import json
 import os
 
@@ -11,13 +12,13 @@ def validate_and_create_actions(buy_analysis, sell_analysis, portfolio_data):
     validation_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
     
     # Get USDC balance from portfolio data
-    usdc_balance = portfolio_data['USDC']['coin_amount']
+    usdc_balance = portfolio_data['USDC'].coin_amount
     print(f"USDC balance: {usdc_balance}")
     
     validation_data = {
         "buy_opportunities": buy_analysis,
         "sell_opportunities": sell_analysis,
-        "portfolio_data": portfolio_data,
+        "portfolio_data": portfolio_to_dict(portfolio_data),
         "usdc_balance": usdc_balance
     }
     
@@ -1,4 +1,5 @@
 from openai import OpenAI
+from coinbase_functions.indicators import indicator_engine, PAYLOAD_INDICATORS
 import json
 import os
 
@@ -17,7 +18,14 @@ def get_market_buy_analysis(market_data):
         # Look for coins with significant movement or volume
         if (abs(coin_data['change_24h']) > 5 or  # More than 5% price change
             coin_data['volume_24h'] > 1000000):  # More than $1M volume
-            volatile_opportunities.append(coin_data)
+            # Send indicators from the shared engine instead of raw candles
+            opportunity = {key: value for key, value in coin_data.items() if key != 'candle_data'}
+            if coin_data.get('candle_data'):
+                indicators = indicator_engine.for_product(
+                    coin_data['symbol'], coin_data['candle_data'], current_price=coin_data['price']
+                )
+                opportunity['indicators'] = indicators.snapshot(PAYLOAD_INDICATORS)
+            volatile_opportunities.append(opportunity)
     
     # Only call OpenAI if we have volatile opportunities
     if volatile_opportunities:
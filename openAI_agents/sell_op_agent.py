@@ -1,4 +1,5 @@
 from openai import OpenAI
+from coinbase_functions.indicators import indicator_engine, PAYLOAD_INDICATORS
 import json
 import os
 
@@ -10,25 +11,27 @@ def get_market_sell_analysis(portfolio_data):
     profitable_positions = {}
     has_profitable_positions = False
     
-    for currency, data in portfolio_data.items():
+    for currency, holding in portfolio_data.items():
         # Skip USDC and MOG
         if currency in ['USDC', 'MOG']:
             continue
             
         # Check if we have all necessary data
-        if (data.get('entry_price') and data.get('current_price') and 
-            data.get('coin_amount') and data.get('usd_value')):
+        if (holding.entry_price and holding.current_price and 
+            holding.coin_amount and holding.usd_value and holding.symbol):
             
-            entry_price = float(data['entry_price'])
-            current_price = float(data['current_price'])
+            indicators = indicator_engine.for_holding(holding)
             
-            # Calculate profit percentage after 1% fee
-            profit_pct = ((current_price - entry_price) / entry_price * 100) - 1
+            # Profit percentage after 1% fee
+            profit_pct = indicators['profit_percentage'] - 1
             
             # Only include positions with profit > 1%
             if profit_pct > 1:
                 has_profitable_positions = True
-                profitable_positions[currency] = data
+                position = holding.to_dict()
+                position['profit_percentage'] = indicators['profit_percentage']
+                position['indicators'] = indicators.snapshot(PAYLOAD_INDICATORS)
+                profitable_positions[currency] = position
     
     # Only call OpenAI if we have profitable positions
     if has_profitable_positions:
@@ -50,7 +53,7 @@ def get_market_sell_analysis(portfolio_data):
     else:
         return json.dumps({
             "portfolio_overview": "No profitable positions found after accounting for 1% fee",
-            "portfolio_total_value": sum(data.get('usd_value', 0) for data in portfolio_data.values()),
-            "available_usdc": portfolio_data.get('USDC', {}).get('coin_amount', 0),
+            "portfolio_total_value": sum(holding.usd_value or 0 for holding in portfolio_data.values()),
+            "available_usdc": portfolio_data['USDC'].coin_amount if 'USDC' in portfolio_data else 0,
             "sell_opportunities": []
         }) 
\ No newline at end of file
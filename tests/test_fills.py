@@ -0,0 +1,126 @@
+import pytest
+
+from coinbase_functions.fills import FillTracker, PositionLedger
+
+
+class StandInFeed:
+    """Local stand-in for the order status endpoint, replaying scripted updates per order"""
+
+    def __init__(self, updates):
+        self.updates = {order_id: list(states) for order_id, states in updates.items()}
+        self.calls = []
+
+    def __call__(self, order_id):
+        self.calls.append(order_id)
+        states = self.updates[order_id]
+        state = states.pop(0) if len(states) > 1 else states[0]
+        if isinstance(state, Exception):
+            raise state
+        return dict(state, order_id=order_id)
+
+
+@pytest.fixture
+def ledger():
+    return PositionLedger()
+
+
+def make_tracker(feed, ledger, tmp_path, **kwargs):
+    tracker = FillTracker(feed, log_file=str(tmp_path / 'fills_log.txt'), **kwargs)
+    tracker.subscribe(lambda fill: ledger.apply_fill(fill['product_id'].split('-')[0], fill))
+    return tracker
+
+
+def test_partial_fills_emit_deltas(ledger, tmp_path):
+    feed = StandInFeed({'order-1': [
+        {'status': 'OPEN', 'filled_size': '0', 'total_value_after_fees': '0'},
+        {'status': 'OPEN', 'filled_size': '1', 'total_value_after_fees': '100'},
+        {'status': 'OPEN', 'filled_size': '1', 'total_value_after_fees': '100'},
+        {'status': 'FILLED', 'filled_size': '3', 'total_value_after_fees': '340'},
+    ]})
+    tracker = make_tracker(feed, ledger, tmp_path)
+    tracker.track('order-1', 'SOL-USDC', 'buy')
+
+    assert tracker.poll_once() == []
+
+    fills = tracker.poll_once()
+    assert [(fill['size'], fill['value'], fill['price']) for fill in fills] == [(1.0, 100.0, 100.0)]
+    assert fills[0]['side'] == 'BUY'
+
+    # No new quantity, no event
+    assert tracker.poll_once() == []
+
+    fills = tracker.poll_once()
+    assert [(fill['size'], fill['value'], fill['price']) for fill in fills] == [(2.0, 240.0, 120.0)]
+    assert fills[0]['status'] == 'FILLED'
+
+    # Terminal status stops tracking
+    assert tracker.pending == []
+    assert tracker.poll_once() == []
+    assert len(feed.calls) == 4
+
+    assert ledger.entry_price('SOL') == pytest.approx(340 / 3)
+    assert len(ledger.fills('SOL')) == 2
+    assert (tmp_path / 'fills_log.txt').exists()
+
+
+def test_sell_fill_reduces_units(ledger, tmp_path):
+    ledger.seed('SOL', 3.0, 100.0)
+    feed = StandInFeed({'order-2': [{'status': 'FILLED', 'filled_size': '2', 'total_value_after_fees': '250'}]})
+    tracker = make_tracker(feed, ledger, tmp_path)
+    tracker.track('order-2', 'SOL-USDC', 'sell')
+
+    tracker.poll_once()
+
+    assert ledger.positions['SOL']['units'] == pytest.approx(1.0)
+    assert ledger.entry_price('SOL') == 100.0
+
+
+@pytest.mark.parametrize('status', ['CANCELLED', 'EXPIRED', 'FAILED'])
+def test_terminal_status_without_fill(ledger, tmp_path, status):
+    feed = StandInFeed({'order-3': [{'status': status, 'filled_size': '0', 'total_value_after_fees': '0'}]})
+    tracker = make_tracker(feed, ledger, tmp_path)
+    tracker.track('order-3', 'SOL-USDC', 'buy')
+
+    assert tracker.poll_once() == []
+    assert tracker.pending == []
+    assert 'SOL' not in ledger
+
+
+def test_untracked_update_is_ignored(ledger, tmp_path):
+    tracker = make_tracker(StandInFeed({}), ledger, tmp_path)
+    assert tracker.handle_update({'order_id': 'other', 'status': 'FILLED', 'filled_size': '1'}) == []
+
+
+def test_gives_up_after_repeated_failures(ledger, tmp_path):
+    feed = StandInFeed({'order-4': [ConnectionError('down')]})
+    tracker = make_tracker(feed, ledger, tmp_path, max_failures=3)
+    tracker.track('order-4', 'SOL-USDC', 'buy')
+
+    tracker.poll_once()
+    tracker.poll_once()
+    assert tracker.pending == ['order-4']
+
+    tracker.poll_once()
+    assert tracker.pending == []
+
+
+def test_successful_poll_resets_failures(ledger, tmp_path):
+    open_state = {'status': 'OPEN', 'filled_size': '0', 'total_value_after_fees': '0'}
+    feed = StandInFeed({'order-5': [ConnectionError('down'), open_state, ConnectionError('down'), open_state]})
+    tracker = make_tracker(feed, ledger, tmp_path, max_failures=2)
+    tracker.track('order-5', 'SOL-USDC', 'buy')
+
+    for _ in range(4):
+        tracker.poll_once()
+    assert tracker.pending == ['order-5']
+
+
+def test_retain_drops_closed_positions(ledger):
+    ledger.seed('SOL', 10.0, 1.0)
+    ledger.seed('BTC', 1.0, 50000.0)
+
+    ledger.retain({'BTC': 1.0})
+    ledger.apply_fill('SOL', {'side': 'BUY', 'size': 5.0, 'value': 10.0, 'price': 2.0})
+
+    assert 'BTC' in ledger
+    assert ledger.entry_price('SOL') == 2.0
@@ -0,0 +1,124 @@
+import json
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from coinbase_functions.orderbook import (
+    OrderBookCache, parse_book, estimate_fill, max_size_within, plan_child_orders
+)
+
+BOOK = {
+    'bids': [['99', '1', 1], ['98', '1', 1], ['97', '2', 1]],
+    'asks': [['100', '1', 1], ['101', '1', 1], ['102', '2', 1]],
+}
+
+
+@pytest.fixture
+def book_server():
+    """Local stand-in for the public L2 book endpoint, counting requests"""
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests_seen.append(self.path)
+            body = json.dumps(BOOK).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}", requests_seen
+    server.shutdown()
+    server.server_close()
+
+
+def fetch_from(url):
+    def fetch(product_id):
+        with urllib.request.urlopen(f"{url}/products/{product_id}/book?level=2", timeout=5) as response:
+            return parse_book(json.load(response))
+    return fetch
+
+
+def test_cache_shares_one_fetch_per_product(book_server):
+    url, requests_seen = book_server
+    cache = OrderBookCache(fetch_from(url), ttl=60)
+
+    first = cache.get('SOL-USDC')
+    second = cache.get('SOL-USDC')
+    cache.get('ETH-USDC')
+
+    assert first is second
+    assert len(requests_seen) == 2
+    assert first['asks'].shape == (3, 2)
+
+
+def test_estimate_fill_walks_levels(book_server):
+    url, _ = book_server
+    book = fetch_from(url)('SOL-USDC')
+
+    estimate = estimate_fill(book, 'BUY', 1.5)
+    assert estimate['avg_price'] == pytest.approx((100 + 0.5 * 101) / 1.5)
+    assert estimate['best_price'] == 100
+    assert estimate['slippage'] == pytest.approx((estimate['avg_price'] - 100) / 100 * 100)
+    assert estimate['levels'] == 2
+
+    # 150 quote buys 1 at 100 and 50/101 at 101
+    estimate = estimate_fill(book, 'BUY', 150, size_in_quote=True)
+    assert estimate['avg_price'] == pytest.approx(150 / (1 + 50 / 101))
+
+    estimate = estimate_fill(book, 'SELL', 2)
+    assert estimate['avg_price'] == pytest.approx(98.5)
+
+
+def test_estimate_fill_thin_book():
+    book = parse_book(BOOK)
+    assert estimate_fill(book, 'BUY', 5) is None
+
+
+@pytest.mark.parametrize('side', ['BUY', 'SELL'])
+@pytest.mark.parametrize('size_in_quote', [False, True])
+def test_max_size_within_hits_slippage_limit(side, size_in_quote):
+    book = parse_book(BOOK)
+    size = max_size_within(book, side, 0.6, size_in_quote)
+
+    estimate = estimate_fill(book, side, size, size_in_quote)
+    assert estimate['slippage'] == pytest.approx(0.6)
+    assert estimate_fill(book, side, size * 1.01, size_in_quote)['slippage'] > 0.6
+
+
+def test_max_size_within_whole_book():
+    book = parse_book(BOOK)
+    assert max_size_within(book, 'BUY', 50) == pytest.approx(4)
+    assert max_size_within(parse_book({'bids': [], 'asks': []}), 'BUY', 1) == 0.0
+
+
+def test_plan_child_orders():
+    book = parse_book(BOOK)
+
+    # Within the limit, no split
+    assert plan_child_orders(book, 'BUY', 0.5, max_slippage=0.5) == [0.5]
+
+    # Each child stays within the limit
+    max_child = max_size_within(book, 'BUY', 0.6)
+    children = plan_child_orders(book, 'BUY', 3, max_slippage=0.6)
+    assert len(children) == -(-3 // max_child)
+    assert sum(children) == pytest.approx(3)
+    assert all(estimate_fill(book, 'BUY', child)['slippage'] <= 0.6 + 1e-9 for child in children)
+
+    # Capped by max_children and min_size
+    assert len(plan_child_orders(book, 'BUY', 3, max_slippage=0.01, max_children=2)) == 2
+    assert len(plan_child_orders(book, 'BUY', 3, max_slippage=0.01, min_size=1.5)) == 2
+
+
+def test_plan_child_orders_empty_size():
+    book = parse_book(BOOK)
+    assert plan_child_orders(book, 'SELL', 0) == []
+    assert plan_child_orders(book, 'SELL', 0, min_size=0.1) == []